@@ -0,0 +1,117 @@
+import gzip
+import re
+from typing import List, Tuple
+
+from lxml import html as lxml_html
+
+# optional, compresses archived writeups better than gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# pages larger than this are not archived
+MAX_PAGE_BYTES = 5 * 1024 * 1024
+
+# elements that never hold the writeup itself
+_SKIP_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg", "iframe"}
+_BLOCK_TAGS = {"p", "div", "section", "article", "main", "blockquote", "table", "tr", "br", "hr", "figure"}
+
+
+def compress(text: str) -> Tuple[str, bytes]:
+    """Compress text with zstd if zstandard is installed, else gzip
+
+    Args:
+        text (str): Text to compress
+
+    Returns:
+        Tuple[str, bytes]: (codec, compressed text)
+    """
+    data = text.encode()
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "gzip", gzip.compress(data, 9)
+
+
+def decompress(codec: str, data: bytes) -> str:
+    """Reverse compress
+
+    Raises:
+        ValueError: If the codec is unknown or zstandard is not installed for zstd
+    """
+    if codec == "gzip":
+        return gzip.decompress(data).decode()
+    if codec == "zstd" and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data).decode()
+    raise ValueError(f"Cannot decompress {codec}")
+
+
+def _walk(el, out: List[str]):
+    """Append the markdown of el and its children to out"""
+    tag = el.tag if isinstance(el.tag, str) else ""
+    if tag in _SKIP_TAGS:
+        out.append(el.tail or "")
+        return
+    if tag == "pre":
+        out.append(f"\n\n```\n{el.text_content().strip(chr(10))}\n```\n\n")
+    elif tag == "code":
+        out.append(f"`{el.text_content()}`")
+    elif tag == "img":
+        if el.get("src"):
+            out.append(f"![{el.get('alt') or ''}]({el.get('src')})")
+    else:
+        link = tag == "a" and el.get("href", "").startswith("http")
+        heading = re.fullmatch(r"h([1-6])", tag)
+        if heading:
+            out.append(f"\n\n{'#' * int(heading.group(1))} ")
+        elif tag == "li":
+            out.append("\n- ")
+        elif tag in _BLOCK_TAGS or tag in ("ul", "ol"):
+            out.append("\n\n")
+        elif link:
+            out.append("[")
+        out.append(el.text or "")
+        for child in el:
+            _walk(child, out)
+        if heading or tag in _BLOCK_TAGS:
+            out.append("\n\n")
+        if link:
+            out.append(f"]({el.get('href')})")
+    out.append(el.tail or "")
+
+
+def extract_text(page: str, content_type: str = "text/html") -> str:
+    """Extract the readable text of a writeup page as markdown. Plain text and
+    markdown pages, like raw gists, are kept as is. From html pages only the
+    article or main element is taken if there is one, without scripts and
+    navigation, and headings, lists, links, images and code blocks are kept
+    as markdown
+
+    Args:
+        page (str): Body of the page
+        content_type (str, optional): Content type of the page. Defaults to "text/html".
+
+    Returns:
+        str: The writeup text, empty if nothing readable was found
+    """
+    if "html" not in content_type:
+        return page.strip()
+    if not page.strip():
+        return ""
+    doc = lxml_html.document_fromstring(page)
+    root = next(doc.iter("article"), None)
+    if root is None:
+        root = next(doc.iter("main"), None)
+    if root is None:
+        root = doc.find("body")
+    if root is None:
+        root = doc
+    out: List[str] = []
+    _walk(root, out)
+    text = "".join(out)
+    # collapse the blank lines and spaces left by the markup, outside of code blocks
+    parts = text.split("```")
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"[ \t]+", " ", parts[i])
+        parts[i] = re.sub(r"\s*\n\s*\n\s*", "\n\n", parts[i])
+    return "```".join(parts).strip()
@@ -0,0 +1,80 @@
+"""Compare the single-pass task extraction with the previous one, which
+parsed every table row again, on a saved ctftime event tasks page
+
+    python benchmarks/event_page.py [--page tasks.html] [--tasks 2000] [--runs 5]
+
+Without --page, a page with --tasks rows in the markup of ctftime is generated.
+"""
+import argparse
+import sys
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+from typing import Callable, Dict, List, Tuple, cast
+
+from parsel import Selector
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from main import extract_event_tasks  # noqa: E402
+
+
+def legacy_extract(data: str) -> Dict[str, str]:
+    """ctftime_get_event before the single-pass extractor"""
+
+    def parse_html(data: str, xpath: str):
+        return Selector(data).xpath(xpath).getall()
+
+    trs = parse_html(data, "//tr")
+    tasks = [parse_html(x, "//a/text() | //a/@href") for x in cast(list, trs)]
+    return {t[1].lower(): t[0] for t in tasks if t is not None and len(t) == 4}
+
+
+def single_pass(data: str) -> Dict[str, str]:
+    return {name.lower(): path for name, path in extract_event_tasks(data)}
+
+
+def generate_page(n: int) -> str:
+    rows = []
+    for i in range(n):
+        # a third of the tasks have no writeups yet
+        action = "" if i % 3 == 0 else f'<a href="/task/{i}" class="btn btn-mini">Writeups</a>'
+        rows.append(
+            f'<tr><td><a href="/task/{i}">Task {i}</a></td><td>{100 + i}</td>'
+            f'<td><span class="label label-info">web</span></td><td>{i % 3}</td>'
+            f"<td>{action}</td></tr>"
+        )
+    return (
+        "<html><head><title>Tasks</title></head><body><div class='container'>"
+        "<table class='table table-striped'><tr><th>Name</th><th>Points</th>"
+        "<th>Tags</th><th>Writeups</th><th>Action</th></tr>"
+        + "".join(rows)
+        + "</table></div></body></html>"
+    )
+
+
+def measure(fn: Callable[[str], Dict[str, str]], data: str, runs: int) -> Tuple[float, Dict[str, str]]:
+    times: List[float] = []
+    for _ in range(runs):
+        start = perf_counter()
+        result = fn(data)
+        times.append(perf_counter() - start)
+    return median(times), result
+
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser()
+    parse.add_argument("--page", help="Saved event tasks page")
+    parse.add_argument("--tasks", type=int, default=2000)
+    parse.add_argument("--runs", type=int, default=5)
+    args = parse.parse_args()
+
+    data = Path(args.page).read_text() if args.page else generate_page(args.tasks)
+    legacy, expected = measure(legacy_extract, data, args.runs)
+    new, result = measure(single_pass, data, args.runs)
+    if result != expected:
+        print("Results differ")
+        sys.exit(1)
+    print(f"{len(result)} tasks, {len(data) / 1024:.0f} KB")
+    print(f"legacy      {legacy * 1000:8.1f} ms")
+    print(f"single pass {new * 1000:8.1f} ms ({legacy / new:.0f}x faster)")
@@ -0,0 +1,131 @@
+"""Time title lookups in TaskIndex against scoring every task of the event,
+and check that both pick the same tasks and that zero-padded task numbers
+still match
+
+    python benchmarks/matching.py [--tasks 500] [--lookups 2000]
+
+Task names are generated from a small vocabulary, and the looked up titles
+are task names with changed case and separators, typos, or no match at all.
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Tuple, Union
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from matching import DEFAULT_THRESHOLD, TaskIndex, normalize_title, numbers, trigrams  # noqa: E402
+
+WORDS = (
+    "baby rev pwn web crypto heap heaven warmup flag shell kernel jail "
+    "sandbox oracle padding format string race cookie admin login secure "
+    "vault maze bank hash rsa aes lattice image audio forensic"
+).split()
+
+
+def naive_match(
+    tasks: Dict[str, str], title: str, threshold: float
+) -> Union[Tuple[str, float], None]:
+    """Score every task, as a fuzzy fallback without an index would"""
+    normalized = normalize_title(title)
+    grams = trigrams(normalized)
+    best, best_score = None, 0.0
+    for name, path in tasks.items():
+        other = normalize_title(name)
+        if other.replace(" ", "") == normalized.replace(" ", ""):
+            return path, 1.0
+        if numbers(other) != numbers(normalized):
+            continue
+        task_grams = trigrams(other)
+        shared = len(grams & task_grams)
+        union = len(grams) + len(task_grams) - shared
+        score = shared / union if union else 0.0
+        if score > best_score:
+            best, best_score = path, score
+    if best is None or best_score < threshold:
+        return None
+    return best, round(best_score, 3)
+
+
+# title -> task it must match
+PADDED = {
+    "crypto 03": "/crypto-3",
+    "Crypto-01": "/crypto-1",
+    "crypto 003": "/crypto-3",
+    "baby rev 2": "/baby-rev-2",
+    "babyrev02": "/baby-rev-2",
+}
+
+
+def check_padded() -> bool:
+    index = TaskIndex(
+        {
+            "crypto 1": "/crypto-1",
+            "Crypto 3": "/crypto-3",
+            "Baby Rev 02": "/baby-rev-2",
+            "baby rev": "/baby-rev",
+        }
+    )
+    ok = True
+    for title, path in PADDED.items():
+        m = index.match(title)
+        if m is None or m[0] != path:
+            print(f"{title} matched {m}, expected {path}")
+            ok = False
+    return ok
+
+
+def generate(n: int, lookups: int) -> Tuple[Dict[str, str], List[str]]:
+    rng = random.Random(1)
+    tasks = {}
+    while len(tasks) < n:
+        name = " ".join(rng.sample(WORDS, rng.randint(1, 3)))
+        if rng.random() < 0.3:
+            name += f" {rng.randint(1, 3)}"
+        tasks.setdefault(name, f"/task/{len(tasks)}")
+    names = list(tasks)
+    titles = []
+    for _ in range(lookups):
+        name = rng.choice(names)
+        kind = rng.random()
+        if kind < 0.4:
+            titles.append(name.title().replace(" ", rng.choice(["-", "_", ""])))
+        elif kind < 0.8:
+            i = rng.randrange(len(name))
+            titles.append(name[:i] + name[i + 1 :])
+        else:
+            titles.append(f"unrelated {rng.randint(0, 99999)}")
+    return tasks, titles
+
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser()
+    parse.add_argument("--tasks", type=int, default=500)
+    parse.add_argument("--lookups", type=int, default=2000)
+    parse.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parse.parse_args()
+
+    if not check_padded():
+        sys.exit(1)
+    tasks, titles = generate(args.tasks, args.lookups)
+    start = perf_counter()
+    index = TaskIndex(tasks, args.threshold)
+    build = perf_counter() - start
+
+    start = perf_counter()
+    indexed = [index.match(t) for t in titles]
+    lookup = (perf_counter() - start) / len(titles)
+    start = perf_counter()
+    naive = [naive_match(tasks, t, args.threshold) for t in titles]
+    scan = (perf_counter() - start) / len(titles)
+
+    # ties may pick different tasks, compare the scores
+    if [m and m[1] for m in indexed] != [m and m[1] for m in naive]:
+        print("Results differ")
+        sys.exit(1)
+    print(f"{len(tasks)} tasks, {len(titles)} lookups, {len([m for m in indexed if m])} matched")
+    print(f"index build     {build * 1000:8.2f} ms")
+    print(f"indexed lookup  {lookup * 1e6:8.1f} us")
+    print(f"full scan       {scan * 1e6:8.1f} us ({scan / lookup:.0f}x slower)")
@@ -0,0 +1,103 @@
+"""Compare the bulk existence check and workspace listing of WriteupStore
+with the previous per-entry lookups on an unindexed table
+
+    python benchmarks/storage.py [--rows 50000] [--entries 5000] [--workspaces 10]
+
+Both tables are filled with the same --rows writeups spread over --workspaces
+workspaces, in temporary dbs, and --entries entry ids of one workspace,
+half of them stored, are looked up.
+"""
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, List, Set, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage import WriteupStore  # noqa: E402
+
+
+def legacy_table(db_path: str) -> sqlite3.Connection:
+    """The ctftime table before WriteupStore, without an index or WAL"""
+    db = sqlite3.connect(db_path)
+    db.execute(
+        """
+        CREATE TABLE ctftime (
+            entry_id varchar PRIMARY KEY,
+            workspace_id varchar NOT NULL,
+            commit_id varchar NOT NULL,
+            writeup text NOT NULL,
+            title text NOT NULL,
+            created_at int64 NOT NULL
+        );
+    """
+    )
+    return db
+
+
+def legacy_existing(db: sqlite3.Connection, entry_ids: List[str]) -> Set[str]:
+    return {
+        e
+        for e in entry_ids
+        if db.execute("SELECT * from ctftime where entry_id = ?", [e]).fetchone()
+        is not None
+    }
+
+
+def rows(n: int, workspaces: int) -> List[List[Any]]:
+    return [
+        [f"entry-{i}", f"ws-{i % workspaces}", f"commit-{i}", f"https://example.com/{i}", f"Task {i}", 0]
+        for i in range(n)
+    ]
+
+
+def timed(fn, *args) -> Tuple[float, Any]:
+    start = perf_counter()
+    result = fn(*args)
+    return perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    parse = argparse.ArgumentParser()
+    parse.add_argument("--rows", type=int, default=50000)
+    parse.add_argument("--entries", type=int, default=5000)
+    parse.add_argument("--workspaces", type=int, default=10)
+    args = parse.parse_args()
+
+    data = rows(args.rows, args.workspaces)
+    # entries of ws-0, every other one stored
+    lookup = [
+        f"entry-{i * args.workspaces}" if i % 2 == 0 else f"missing-{i}"
+        for i in range(args.entries)
+    ]
+
+    with TemporaryDirectory() as d:
+        legacy = legacy_table(str(Path(d) / "legacy.db"))
+        legacy.executemany("INSERT into ctftime values (?,?,?,?,?,?)", data)
+        legacy.commit()
+        store = WriteupStore(str(Path(d) / "store.db"))
+        store.set_entries(data)
+
+        legacy_lookup, expected = timed(legacy_existing, legacy, lookup)
+        bulk_lookup, result = timed(store.existing_entry_ids, "ws-0", lookup)
+        if result != expected:
+            print("Results differ")
+            sys.exit(1)
+        legacy_stats, expected = timed(
+            lambda: legacy.execute(
+                "SELECT title, writeup FROM ctftime where workspace_id = 'ws-0'"
+            ).fetchall()
+        )
+        stats, result = timed(store.get_entries, "ws-0")
+        if sorted(result) != sorted(expected):
+            print("Results differ")
+            sys.exit(1)
+        legacy.close()
+        store.close()
+
+    print(f"{args.rows} stored writeups, {args.entries} entries looked up")
+    print(f"lookup  per entry {legacy_lookup * 1000:8.1f} ms  bulk    {bulk_lookup * 1000:8.1f} ms")
+    print(f"stats   scan      {legacy_stats * 1000:8.1f} ms  indexed {stats * 1000:8.1f} ms")
@@ -0,0 +1,166 @@
+import re
+import sqlite3
+import zlib
+from threading import Lock
+from time import time
+from typing import List, Tuple, Union
+
+import requests
+
+# (url regex, seconds a response is used without revalidating). First match wins
+DEFAULT_TTLS = [
+    # task lists change while an event runs
+    (r"/event/\d+/tasks/?$", 60 * 60),
+    (r"/task/\d+", 24 * 60 * 60),
+    # writeup pages rarely change once posted
+    (r"/writeup/\d+", 30 * 24 * 60 * 60),
+]
+DEFAULT_TTL = 60 * 60
+# 64 MB of compressed bodies
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class HttpCache:
+    """Cache of GET responses in a sqlite table. Bodies are stored zlib
+    compressed and the least recently used responses are evicted once the
+    stored bodies exceed max_bytes. Safe to use from several threads
+
+    Args:
+        db_path (str): Path of the sqlite db
+        ttls (List[Tuple[str, int]], optional): (url regex, ttl seconds) pairs.
+            Defaults to DEFAULT_TTLS.
+        default_ttl (int, optional): ttl of urls no pattern matches. Defaults to DEFAULT_TTL.
+        max_bytes (int, optional): Size cap of the stored bodies. Defaults to DEFAULT_MAX_BYTES.
+    """
+
+    _table_name = "http_cache"
+
+    def __init__(
+        self,
+        db_path: str,
+        ttls: List[Tuple[str, int]] = DEFAULT_TTLS,
+        default_ttl: int = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.ttls = [(re.compile(p), t) for p, t in ttls]
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS '{self._table_name}' (
+                url text PRIMARY KEY,
+                etag text,
+                last_modified text,
+                encoding text,
+                body blob NOT NULL,
+                size int NOT NULL,
+                fetched_at real NOT NULL,
+                accessed_at real NOT NULL
+            );
+        """
+        )
+        self.db.commit()
+
+    def ttl(self, url: str) -> int:
+        """Seconds a response for url is used without revalidating"""
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return self.default_ttl
+
+    def get(
+        self, session: requests.Session, url: str, **kwargs
+    ) -> requests.Response:
+        """GET url through the cache. A fresh cached response is returned as is.
+        A stale one is revalidated with If-None-Match / If-Modified-Since and
+        returned again on a 304. Other 200 responses are stored
+
+        Args:
+            session (requests.Session): Session to make requests with
+            url (str): url to get
+            **kwargs: passed to session.get
+
+        Returns:
+            requests.Response: The live or cached response
+        """
+        with self.lock:
+            row = self.db.execute(
+                f"SELECT etag, last_modified, encoding, body, fetched_at FROM {self._table_name} WHERE url = ?",
+                [url],
+            ).fetchone()
+        if row is not None:
+            etag, last_modified, encoding, body, fetched_at = row
+            if time() - fetched_at < self.ttl(url):
+                self._touch(url, fetched_at)
+                return self._response(url, encoding, body)
+            headers = dict(kwargs.pop("headers", None) or {})
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+            res = session.get(url, headers=headers, **kwargs)
+            if res.status_code == 304:
+                self._touch(url, time())
+                return self._response(url, encoding, body)
+        else:
+            res = session.get(url, **kwargs)
+        if res.status_code == 200:
+            self._store(url, res)
+        return res
+
+    def _response(self, url: str, encoding: Union[str, None], body: bytes) -> requests.Response:
+        res = requests.Response()
+        res.status_code = 200
+        res.url = url
+        res.encoding = encoding
+        res._content = zlib.decompress(body)
+        return res
+
+    def _touch(self, url: str, fetched_at: float):
+        with self.lock:
+            self.db.execute(
+                f"UPDATE {self._table_name} SET fetched_at = ?, accessed_at = ? WHERE url = ?",
+                [fetched_at, time(), url],
+            )
+            self.db.commit()
+
+    def _store(self, url: str, res: requests.Response):
+        body = zlib.compress(res.content, 6)
+        now = time()
+        with self.lock:
+            self.db.execute(
+                f"INSERT OR REPLACE INTO {self._table_name} VALUES (?,?,?,?,?,?,?,?)",
+                [
+                    url,
+                    res.headers.get("ETag"),
+                    res.headers.get("Last-Modified"),
+                    res.encoding,
+                    body,
+                    len(body),
+                    now,
+                    now,
+                ],
+            )
+            self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        """Delete least recently used responses until the bodies fit max_bytes"""
+        total = self.db.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self._table_name}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.db.execute(
+            f"SELECT url, size FROM {self._table_name} ORDER BY accessed_at"
+        ).fetchall()
+        stale = []
+        for url, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append([url])
+            total -= size
+        self.db.executemany(f"DELETE FROM {self._table_name} WHERE url = ?", stale)
+
+    def close(self):
+        self.db.close()
@@ -1,14 +1,55 @@
 import re
 import argparse
 from typing import Any, Dict, List, Union, cast, Tuple
-import sqlite3
-from time import time
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from time import time, monotonic
 from pathlib import Path
+from urllib.parse import urlparse
 import requests
+from requests.adapters import HTTPAdapter
+from lxml import html as lxml_html
 from parsel import Selector
-from mixto import MixtoLite
+from mixto import MixtoLite, RequestTimeout, BadResponse
+from http_cache import HttpCache, DEFAULT_TTLS, DEFAULT_MAX_BYTES
+from storage import WriteupStore
+from matching import TaskIndex, DEFAULT_THRESHOLD
+from archive import extract_text, MAX_PAGE_BYTES
 
 CTFTIME_URL = "https://ctftime.org"
+# commit data sent in one batch, unless a single entry needs more
+BATCH_MAX_BYTES = 4 * 1024 * 1024
+
+
+def extract_event_tasks(data: str) -> List[Tuple[str, str]]:
+    """Extract the tasks of a ctftime event tasks page in one pass over the
+    parsed document. For every row the hrefs and texts of its links are taken
+    in document order, and rows with a task link and a writeups link yield
+    the task
+
+    Args:
+        data (str): html of the event tasks page
+
+    Returns:
+        List[Tuple[str, str]]: (task name, task path) tuples in page order
+    """
+    if not data.strip():
+        return []
+    tasks = []
+    for tr in lxml_html.document_fromstring(data).iter("tr"):
+        items = []
+        for a in tr.iter("a"):
+            href = a.get("href")
+            if href is not None:
+                items.append(href)
+            # the text nodes directly inside the link
+            if a.text is not None:
+                items.append(a.text)
+            items.extend(child.tail for child in a if child.tail is not None)
+        if len(items) == 4:
+            tasks.append((items[1], items[0]))
+    return tasks
 
 
 class CtftimeWriteup(MixtoLite):
@@ -18,84 +59,127 @@ class CtftimeWriteup(MixtoLite):
         MixtoLite (MixtoLite): MixtoLite sdk
     """
 
-    def __init__(self, event_id: str):
+    def __init__(
+        self,
+        event_id: str,
+        workers: int = 8,
+        per_host: int = 4,
+        cache: bool = True,
+        cache_ttls: List[Tuple[str, int]] = DEFAULT_TTLS,
+        cache_max_bytes: int = DEFAULT_MAX_BYTES,
+        workspace_id: Union[str, None] = None,
+        shared: Union["CtftimeWriteup", None] = None,
+        match_threshold: float = DEFAULT_THRESHOLD,
+        archive: bool = False,
+        commit_batch: int = 50,
+    ):
         """Initialize with ctftime event id
 
         Args:
             event_id (str): ctftime event id
+            workers (int, optional): Concurrent task and writeup lookups. Defaults to 8.
+            per_host (int, optional): Max concurrent requests to one host. Defaults to 4.
+            cache (bool, optional): Cache ctftime pages in mixto.db. Defaults to True.
+            cache_ttls (List[Tuple[str, int]], optional): (url regex, ttl seconds) pairs.
+            cache_max_bytes (int, optional): Size cap of the cached pages.
+            workspace_id (str, optional): Workspace to add writeups to. Defaults to
+                the workspace of ~/.mixto.json.
+            shared (CtftimeWriteup, optional): Reuse the session, per host limits, cache
+                and db of this instance instead of opening new ones. Used by batch mode.
+            match_threshold (float, optional): Minimum trigram similarity of an entry
+                title and a task name that are not equal. Defaults to DEFAULT_THRESHOLD.
+            archive (bool, optional): Also commit the text of the original writeup
+                pages, archived in mixto.db. Defaults to False.
+            commit_batch (int, optional): Entries whose commits are added in one
+                request. Defaults to 50.
         """
         super().__init__()
         self.commit_type = "url"
-        self._table_name = "ctftime"
         self.event_id = event_id
+        if workspace_id is not None:
+            self.workspace_id = workspace_id
+        # prepended to printed lines, set in batch mode to tell events apart
+        self.log_prefix = ""
+        # absolute time.monotonic() deadline for the whole run. None means no budget
+        self.deadline: Union[float, None] = None
         self.request_headers = {
             "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36"
         }
+        self.workers = workers
+        self.per_host = per_host
+        self.match_threshold = match_threshold
+        self.archive = archive
+        self.commit_batch = commit_batch
+        if shared is not None:
+            self.session = shared.session
+            self._host_slots = shared._host_slots
+            self._host_slots_lock = shared._host_slots_lock
+            self.store = shared.store
+            self.cache = shared.cache
+            return
+        # keep-alive session shared by all lookups
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=per_host, pool_maxsize=per_host)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(self.request_headers)
+        self._host_slots: Dict[str, BoundedSemaphore] = {}
+        self._host_slots_lock = Lock()
         # create db bindings
-        self.db = sqlite3.connect(str(Path(Path.home() / ".mixto" / "mixto.db")))
-        self.cursor = self.db.cursor()
-        # create table
-        self.db.execute(
-            f"""
-            CREATE TABLE IF NOT EXISTS '{self._table_name}' (
-                entry_id varchar PRIMARY KEY,
-                workspace_id varchar NOT NULL,
-                commit_id varchar NOT NULL,
-                writeup text NOT NULL,
-                title text NOT NULL,
-                created_at int64 NOT NULL
-            );
-        """
+        db_path = str(Path(Path.home() / ".mixto" / "mixto.db"))
+        self.store = WriteupStore(db_path)
+        self.cache: Union[HttpCache, None] = (
+            HttpCache(db_path, cache_ttls, max_bytes=cache_max_bytes) if cache else None
         )
 
-    def _db_get_entry(
-        self, entry_id: str
-    ) -> Union[None, Tuple[str, str, str, str, int]]:
-        """Get an entry from the db. If entry does not exist, the return value is None.
-        Order of values are entry_id, workspace_id, commit_id, writeup, title, int(time())
-
-        Args:
-            entry_id (str): _description_
-
-        Returns:
-            Union[None, Tuple[str, str, str, str, int]]: _description_
-        """
-        return self.cursor.execute(
-            f"SELECT * from {self._table_name} where entry_id = ?", [entry_id]
-        ).fetchone()
-
-    def _db_get_entries(self):
-        """Get all writeups added for a workspace
-
-        Returns:
-            List[Any]: List of writeups
-        """
-        return self.cursor.execute(
-            f"SELECT title, writeup FROM {self._table_name} where workspace_id = '{self.workspace_id}'"
-        ).fetchall()
-
-    def _db_set_entries(self, entries: List[List[Any]]):
-        """Insert multiple entries to the db. Order of values are
-        entry_id, workspace_id, commit_id, writeup, title, int(time())
-
-        Args:
-            entries (List[List[Any]]): Array of rows
-        """
-        self.cursor.executemany(
-            f"INSERT into {self._table_name} values (?,?,?,?,?,?)", entries
-        )
-        self.db.commit()
-
-    def make_request(self, url: str) -> requests.Response:
-        """Make a ctftime request
+    def log(self, *args: Any):
+        """print with the log prefix of this instance"""
+        if self.log_prefix:
+            print(self.log_prefix, *args)
+        else:
+            print(*args)
+
+    def close(self):
+        """Close the sqlite connections"""
+        self.store.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def _host_slot(self, url: str) -> BoundedSemaphore:
+        """Semaphore limiting the concurrent requests to the host of url"""
+        host = urlparse(url).netloc
+        with self._host_slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = BoundedSemaphore(self.per_host)
+            return self._host_slots[host]
+
+    def make_request(self, url: str, cache: bool = True, stream: bool = False) -> requests.Response:
+        """Make a ctftime request over the shared session, with at most per_host
+        requests to a host in flight. The read timeout is capped by what is left
+        of the run deadline
 
         Args:
             url (str): url to make the request
+            cache (bool, optional): Go through the cache if it is enabled. Defaults to True.
+            stream (bool, optional): Dont read the body yet. Never cached. Defaults to False.
+
+        Raises:
+            RequestTimeout: If the run deadline has already passed
 
         Returns:
             requests.Response: requests.Response object
         """
-        return requests.get(url, headers=self.request_headers)
+        read_timeout = self.read_timeout
+        if self.deadline is not None:
+            left = self.deadline - monotonic()
+            if left <= 0:
+                raise RequestTimeout("Ran past the deadline")
+            read_timeout = min(read_timeout, left)
+        timeout = (self.connect_timeout, read_timeout)
+        with self._host_slot(url):
+            if self.cache is not None and cache and not stream:
+                return self.cache.get(self.session, url, timeout=timeout)
+            return self.session.get(url, timeout=timeout, stream=stream)
 
     def validate(self, id: str):
         """Validate that the id only includes numbers
@@ -140,9 +224,8 @@ class CtftimeWriteup(MixtoLite):
         self.validate(event_id)
         url = f"{CTFTIME_URL}/event/{event_id}/tasks/"
         res = self.make_request(url)
-        trs = self.parse_html(res.text, "//tr")
-        tasks = [self.parse_html(x, "//a/text() | //a/@href") for x in cast(list, trs)]
-        return {t[1].lower(): t[0] for t in tasks if t is not None and len(t) == 4}
+        res.raise_for_status()
+        return {name.lower(): path for name, path in extract_event_tasks(res.text)}
 
     def ctftime_get_task(self, task_path: str):
         """Get the url for a single write for a task
@@ -172,34 +255,399 @@ class CtftimeWriteup(MixtoLite):
         writeup = self.parse_html(res.text, "//div[@class = 'well']/a/@href", False)
         return writeup
 
-    def match_mixto_entries(self, force:bool = False) -> Dict[str, Dict[str, str]]:
+    def resolve_writeups(
+        self, tasks: Dict[str, Dict[str, Any]]
+    ) -> Dict[str, Union[str, None]]:
+        """Resolve the writeup url of every matched task concurrently, up to
+        workers at a time. Lookups that fail or time out resolve to None
+
+        Args:
+            tasks (Dict[str, Dict[str, Any]]): Output of match_mixto_entries
+
+        Returns:
+            Dict[str, Union[str, None]]: Dict where key is the mixto entry id and the
+            value is the writeup url, in the order of tasks
+        """
+
+        def resolve(task: Dict[str, Any]) -> Union[str, None]:
+            try:
+                writeup_path = self.ctftime_get_task(task["writeup"])
+                if not writeup_path:
+                    return None
+                return cast(str, self.ctftime_get_writeup(cast(str, writeup_path)))
+            except (RequestTimeout, requests.RequestException) as e:
+                self.log(f'Failed to get writeup for {task["title"]}: {e}')
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            writeups = pool.map(resolve, tasks.values())
+            return dict(zip(tasks.keys(), writeups))
+
+    def fetch_writeup_text(self, url: str) -> Union[str, None]:
+        """Fetch an original writeup page and extract its text. Pages over
+        MAX_PAGE_BYTES are not read
+
+        Args:
+            url (str): Original writeup url
+
+        Returns:
+            Union[str, None]: The writeup text, or None if the page could not be
+            fetched or has no readable text
+        """
+        try:
+            res = self.make_request(url, cache=False, stream=True)
+            with res:
+                res.raise_for_status()
+                if int(res.headers.get("Content-Length") or 0) > MAX_PAGE_BYTES:
+                    return None
+                chunks = []
+                size = 0
+                for chunk in res.iter_content(65536):
+                    size += len(chunk)
+                    if size > MAX_PAGE_BYTES:
+                        return None
+                    chunks.append(chunk)
+            content_type = res.headers.get("Content-Type", "text/html")
+            # requests assumes latin-1 for text without a charset
+            encoding = res.encoding if "charset" in content_type else "utf-8"
+            page = b"".join(chunks).decode(encoding or "utf-8", errors="replace")
+            return extract_text(page, content_type) or None
+        except (RequestTimeout, requests.RequestException, ValueError) as e:
+            self.log(f"Failed to archive {url}: {e}")
+            return None
+
+    def archive_writeups(
+        self, writeups: Dict[str, Union[str, None]]
+    ) -> Dict[str, Union[str, None]]:
+        """Archive the original writeup pages. Urls archived by an earlier run are
+        read from the db, the others are fetched concurrently, up to workers at a
+        time, and stored compressed and deduplicated by content
+
+        Args:
+            writeups (Dict[str, Union[str, None]]): Output of resolve_writeups
+
+        Returns:
+            Dict[str, Union[str, None]]: Dict where key is the mixto entry id and the
+            value is the archived text, None if the page could not be archived
+        """
+        urls = list({u: None for u in writeups.values() if u})
+        texts = {u: self.store.get_archive(u) for u in urls}
+        missing = [u for u, t in texts.items() if t is None]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            fetched = dict(zip(missing, pool.map(self.fetch_writeup_text, missing)))
+        new = [(u, t) for u, t in fetched.items() if t is not None]
+        if new:
+            self.store.set_archives(new)
+        texts.update(fetched)
+        return {e: texts[u] if u else None for e, u in writeups.items()}
+
+    def match_mixto_entries(self, force:bool = False) -> Dict[str, Dict[str, Any]]:
         """Get entries from mixto and check against ctftime writeups for overlap.
-        This method does rely that the ctftime task name is equal to the entry name
-        in mixto
+        Titles are matched with TaskIndex, so "Baby-Rev" still matches a task named
+        "baby rev", and other titles need a trigram similarity of match_threshold
+        and the same numbers as the task. Every task goes to at most one entry
 
         Args:
             force (bool): Add writeup even if it exists. Useful for updating multiple instances
 
         Returns:
-            Dict[str, Dict[str, str]]: Dict where key is the mixto entry id and value is a
-            dict containing title and writup link.
+            Dict[str, Dict[str, Any]]: Dict where key is the mixto entry id and value is a
+            dict containing title, writup link and the confidence of the match.
         """
         hold = {}
-        entries = self.GetEntryIDs()
-        events = self.ctftime_get_event(self.event_id)
+        self.reconcile_pending()
+        entries = self.GetEntryIDs(deadline=self.deadline)
+        index = TaskIndex(self.ctftime_get_event(self.event_id), self.match_threshold)
+
+        # entries in the db already have a writeup added and are skipped
+        existing = (
+            set()
+            if force
+            else self.store.existing_entry_ids(
+                self.workspace_id, [e["entry_id"] for e in entries]
+            )
+        )
 
+        titles = {}
         for e in entries:
-            # check if entry id exists in db. If it does, a writeup has been added for it
-            # already and we can skip it. A none value means it does not exist
-            if self._db_get_entry(e["entry_id"]) is not None and not force:
-                print(f'Skipping {e["title"]}. Writeup already exists')
+            if e["entry_id"] in existing:
+                self.log(f'Skipping {e["title"]}. Writeup already exists')
                 continue
+            titles[e["entry_id"]] = e["title"]
 
-            m = events.get(e["title"].lower())
+        matched = index.match_all(titles)
+        for entry_id, title in titles.items():
+            m = matched.get(entry_id)
             if m:
-                hold[e["entry_id"]] = {"writeup": m, "title": e["title"]}
+                hold[entry_id] = {"writeup": m[0], "title": title, "confidence": m[1]}
         return hold
 
+    def reconcile_pending(self):
+        """Settle the writeups an interrupted run left pending in the db. A writeup
+        whose url commit is found on its entry is recorded as added, the others
+        are cleared so they are added again
+        """
+        pending = self.store.get_pending(str(self.workspace_id))
+        if not pending:
+            return
+        query = """query q($ids: [String!]!, $commit_type: String!) {
+            commits: mixto_commits(
+                where: { entry_id: { _in: $ids }, commit_type: { _eq: $commit_type } }
+            ) {
+                commit_id
+                entry_id
+                data
+            }
+        }"""
+        commits = self.GraphQL(
+            query,
+            {"ids": [p[0] for p in pending], "commit_type": self.commit_type},
+            deadline=self.deadline,
+        )["commits"]
+        found = {(c["entry_id"], c["data"]): c["commit_id"] for c in commits}
+        done, dropped = [], []
+        for entry_id, writeup, title in pending:
+            commit_id = found.get((entry_id, writeup))
+            if commit_id is None:
+                dropped.append(entry_id)
+            else:
+                done.append([entry_id, self.workspace_id, commit_id, writeup, title, int(time())])
+        if done:
+            self.store.complete(done)
+        if dropped:
+            self.store.drop_pending(dropped)
+        self.log(f"{len(done)} of {len(pending)} writeups left pending by an earlier run were added")
+
+    def commit_writeups(
+        self,
+        writeups: List[Tuple[str, Dict[str, Any], str, Union[str, None]]],
+        report: "EventReport",
+    ):
+        """Add writeup commits in batches of up to commit_batch entries and
+        BATCH_MAX_BYTES of data, one request per batch. Every batch is recorded
+        as pending before it is sent and as added right after Mixto accepts it,
+        so a run stopped at any point neither loses nor repeats a commit. The
+        commits of one entry are always in the same batch
+
+        Args:
+            writeups (List[Tuple[str, Dict[str, Any], str, Union[str, None]]]): entry id,
+                task, writeup url and archived text of every writeup to add
+            report (EventReport): Receives the added and archived counts
+        """
+
+        def commits(item: Tuple[str, Dict[str, Any], str, Union[str, None]]) -> List[Dict[str, Any]]:
+            entry_id, _, writeup, text = item
+            hold = [{"entry_id": entry_id, "data": writeup, "title": "", "meta": {"documentation": True}}]
+            if text:
+                hold.append(
+                    {
+                        "entry_id": entry_id,
+                        "data": f"Archived from {writeup}\n\n{text}",
+                        "title": "Writeup archive",
+                        "commit_type": "dump",
+                        "meta": {"documentation": True},
+                    }
+                )
+            return hold
+
+        batches: List[List[Tuple[str, Dict[str, Any], str, Union[str, None]]]] = []
+        size = 0
+        for item in writeups:
+            item_size = sum(len(c["data"]) for c in commits(item))
+            if not batches or len(batches[-1]) >= self.commit_batch or size + item_size > BATCH_MAX_BYTES:
+                batches.append([])
+                size = 0
+            batches[-1].append(item)
+            size += item_size
+
+        for batch in batches:
+            self.store.set_pending(
+                [[e, self.workspace_id, w, task["title"], int(time())] for e, task, w, _ in batch]
+            )
+            try:
+                commit_ids = iter(
+                    self.AddCommits([c for item in batch for c in commits(item)], self.deadline)
+                )
+            except (BadResponse, ValueError) as e:
+                # Mixto rejected the batch and nothing of it was added. After a 5xx
+                # the outcome is unknown and the next run checks it with Mixto
+                if isinstance(e, ValueError) or e.args[0] < 500:
+                    self.store.drop_pending([item[0] for item in batch])
+                raise
+            added = []
+            for entry_id, task, writeup, text in batch:
+                task["commit_id"] = next(commit_ids)
+                if text:
+                    next(commit_ids)
+                    report.archived += 1
+                added.append(
+                    [entry_id, self.workspace_id, task["commit_id"], writeup, task["title"], int(time())]
+                )
+            self.store.complete(added)
+            report.added += len(added)
+            for _, task, _, _ in batch:
+                self.log(task)
+
+    def add_writeups(self, force: bool = False, dry_run: bool = False) -> "EventReport":
+        """Match the workspace entries with the event tasks, look up their writeups
+        and commit them in batches. Every batch is recorded in the db as soon as it
+        is added, so a failing batch keeps the ones before it
+
+        Args:
+            force (bool, optional): Add writeup even if it exists. Defaults to False.
+            dry_run (bool, optional): Print the matches without adding commits. Defaults to False.
+
+        Returns:
+            EventReport: Counts of the run
+        """
+        report = EventReport(self.event_id, str(self.workspace_id))
+        start = monotonic()
+        try:
+            tasks = self.match_mixto_entries(force)
+            report.matched = len(tasks)
+            # look up all writeups concurrently, then commit them in order
+            writeups = self.resolve_writeups(tasks)
+            archives: Dict[str, Union[str, None]] = {}
+            if self.archive and not dry_run:
+                archives = self.archive_writeups(writeups)
+            hold = []
+            for entry_id, task in tasks.items():
+                writeup = writeups[entry_id]
+                # if dry run, dont add any commits
+                if dry_run:
+                    self.log(entry_id, task)
+
+                elif writeup and int(self.event_id) > 1:
+                    hold.append((entry_id, task, writeup, archives.get(entry_id)))
+                elif not writeup:
+                    report.missing += 1
+            self.commit_writeups(hold, report)
+        except (RequestTimeout, requests.Timeout) as e:
+            self.log(f"Stopping early: {e}")
+            report.error = str(e)
+        finally:
+            report.seconds = monotonic() - start
+        return report
+
+
+@dataclass
+class EventReport:
+    """Outcome of adding the writeups of one event to one workspace"""
+
+    event_id: str
+    workspace_id: str
+    matched: int = 0
+    added: int = 0
+    # matched tasks without a writeup url
+    missing: int = 0
+    # writeup texts committed with --archive
+    archived: int = 0
+    seconds: float = 0
+    error: Union[str, None] = None
+
+
+def read_batch_file(path: str) -> List[Tuple[str, str]]:
+    """Read (event_id, workspace_id) pairs from a file with one pair per line,
+    separated by whitespace or a comma. Empty lines and lines starting with #
+    are skipped
+
+    Args:
+        path (str): Path of the mapping file
+
+    Raises:
+        ValueError: If a line is not a pair
+
+    Returns:
+        List[Tuple[str, str]]: (event_id, workspace_id) pairs in file order
+    """
+    jobs = []
+    for n, line in enumerate(Path(path).read_text().splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.replace(",", " ").split()
+        if len(parts) != 2:
+            raise ValueError(f"{path}:{n}: expected event_id and workspace_id")
+        jobs.append((parts[0], parts[1]))
+    return jobs
+
+
+def run_batch(
+    base: CtftimeWriteup,
+    jobs: List[Tuple[str, str]],
+    events: int = 4,
+    force: bool = False,
+    dry_run: bool = False,
+) -> List[EventReport]:
+    """Add the writeups of several events, up to events at a time. Every event
+    shares the session, per host limits, cache and db of base, so the per host
+    limit holds across all of them. Events of the same workspace run one after
+    another in file order, so an entry matching tasks of two events only gets
+    the writeup of the first. An event that fails is reported and does not stop
+    the others
+
+    Args:
+        base (CtftimeWriteup): Instance whose resources and settings are shared
+        jobs (List[Tuple[str, str]]): (event_id, workspace_id) pairs
+        events (int, optional): Workspaces processed concurrently. Defaults to 4.
+        force (bool, optional): Add writeups even if they exist. Defaults to False.
+        dry_run (bool, optional): Dont add any commits. Defaults to False.
+
+    Returns:
+        List[EventReport]: One report per job, in the order of jobs
+    """
+
+    def run(job: Tuple[str, str]) -> EventReport:
+        event_id, workspace_id = job
+        try:
+            c = CtftimeWriteup(
+                event_id,
+                base.workers,
+                base.per_host,
+                workspace_id=workspace_id,
+                shared=base,
+                match_threshold=base.match_threshold,
+                archive=base.archive,
+                commit_batch=base.commit_batch,
+            )
+            c.deadline = base.deadline
+            c.log_prefix = f"[{event_id} {workspace_id}]"
+            return c.add_writeups(force, dry_run)
+        except Exception as e:
+            print(f"[{event_id} {workspace_id}] Failed: {e}")
+            return EventReport(event_id, workspace_id, error=str(e))
+
+    by_workspace: Dict[str, List[int]] = {}
+    for i, (_, workspace_id) in enumerate(jobs):
+        by_workspace.setdefault(workspace_id, []).append(i)
+    reports: List[Union[EventReport, None]] = [None] * len(jobs)
+
+    def run_workspace(indexes: List[int]):
+        for i in indexes:
+            reports[i] = run(jobs[i])
+
+    with ThreadPoolExecutor(max_workers=events) as pool:
+        list(pool.map(run_workspace, by_workspace.values()))
+    return cast(List[EventReport], reports)
+
+
+def print_batch_summary(reports: List[EventReport]):
+    """Print a table of the batch reports and their totals"""
+    print(
+        f"{'event':>8} {'workspace':<36} {'matched':>7} {'added':>6} "
+        f"{'archived':>8} {'missing':>7} {'seconds':>8}  error"
+    )
+    for r in reports:
+        print(
+            f"{r.event_id:>8} {r.workspace_id:<36} {r.matched:>7} {r.added:>6} "
+            f"{r.archived:>8} {r.missing:>7} {r.seconds:>8.1f}  {r.error or ''}"
+        )
+    failed = len([r for r in reports if r.error])
+    print(
+        f"{len(reports)} events, {failed} failed, "
+        f"{sum(r.matched for r in reports)} matched, {sum(r.added for r in reports)} added"
+    )
+
 
 if __name__ == "__main__":
     parse = argparse.ArgumentParser()
@@ -216,45 +664,105 @@ if __name__ == "__main__":
     parse.add_argument(
         "--force", action="store_true", default=False, help="Force add writeups"
     )
+    parse.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Concurrent task and writeup lookups",
+    )
+    parse.add_argument(
+        "--per-host",
+        type=int,
+        default=4,
+        help="Max concurrent requests to one host",
+    )
+    parse.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Always fetch ctftime pages instead of using the cache in mixto.db",
+    )
+    parse.add_argument(
+        "--cache-ttl",
+        action="append",
+        default=[],
+        metavar="REGEX=SECONDS",
+        help="Cache urls matching REGEX for SECONDS. Can be repeated and takes precedence over the defaults",
+    )
+    parse.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        help="Size cap of the cache in MB",
+    )
+    parse.add_argument(
+        "--deadline",
+        type=float,
+        help="Stop adding writeups after this many seconds. Writeups added so far are kept",
+    )
+    parse.add_argument(
+        "--match-threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Minimum similarity between 0 and 1 of entry titles and task names that are not equal",
+    )
+    parse.add_argument(
+        "--archive",
+        action="store_true",
+        default=False,
+        help="Also commit the text of the original writeup pages, archived compressed in mixto.db",
+    )
+    parse.add_argument(
+        "--commit-batch",
+        type=int,
+        default=50,
+        help="Entries whose writeup commits are added in one request",
+    )
+    parse.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="Add writeups for every event_id workspace_id pair in FILE, one pair per line",
+    )
+    parse.add_argument(
+        "--events",
+        type=int,
+        default=4,
+        help="Workspaces processed concurrently in batch mode",
+    )
     args = parse.parse_args()
 
-    c = CtftimeWriteup(str(args.event))
+    ttls = []
+    for t in args.cache_ttl:
+        pattern, _, seconds = t.rpartition("=")
+        ttls.append((pattern, int(seconds)))
+    c = CtftimeWriteup(
+        str(args.event),
+        args.workers,
+        args.per_host,
+        cache=not args.no_cache,
+        cache_ttls=ttls + DEFAULT_TTLS,
+        cache_max_bytes=args.cache_size * 1024 * 1024,
+        match_threshold=args.match_threshold,
+        archive=args.archive,
+        commit_batch=args.commit_batch,
+    )
+    if args.deadline is not None:
+        c.deadline = monotonic() + args.deadline
 
     # only show entries that already have a ctftime commit added to it
     if args.stats:
-        writeups = c._db_get_entries()
+        writeups = c.store.get_entries(c.workspace_id)
         for w in writeups:
             print("| {:1} | {:^4} |".format(*w))
+        c.close()
         exit()
 
-    # holder to save all added entries in the end
-    _added_entries = []
-    for entry_id, task in c.match_mixto_entries(args.force).items():
-        task_id = c.ctftime_get_task(task["writeup"])
-        writeup = cast(str, c.ctftime_get_writeup(cast(str, task_id)))
-        # if dry run, dont add any commits
-        if args.dry_run:
-            print(entry_id, task)
-
-        elif writeup and not args.dry_run and args.event > 1:
-            res = c.AddCommit(
-                entry_id=entry_id, data=writeup, optional={"documentation": True}
-            )
-            task["commit_id"] = res["commit_id"]
-            _added_entries.append(
-                [
-                    entry_id,
-                    c.workspace_id,
-                    res["commit_id"],
-                    writeup,
-                    task["title"],
-                    int(time()),
-                ]
-            )
-            print(task)
-
-    if len(_added_entries) > 0:
-        # commits were added to save it to the db
-        c._db_set_entries(_added_entries)
-    # close sqlite connection
-    c.db.close()
+    if args.batch:
+        reports = run_batch(
+            c, read_batch_file(args.batch), args.events, args.force, args.dry_run
+        )
+        print_batch_summary(reports)
+    else:
+        c.add_writeups(args.force, args.dry_run)
+    # close sqlite connections
+    c.close()
@@ -0,0 +1,167 @@
+import re
+import unicodedata
+from typing import Dict, List, Set, Tuple, Union
+
+# minimum trigram similarity of a fuzzy match
+DEFAULT_THRESHOLD = 0.7
+
+
+def normalize_title(title: str) -> str:
+    """Lowercase title, strip accents and turn every run of other characters
+    than letters and digits into one space, and drop the leading zeros of
+    numbers, so that "Baby-Rev" and "baby rev", or "Crypto 01" and "crypto 1",
+    are the same
+
+    Args:
+        title (str): Entry or task title
+
+    Returns:
+        str: The normalized title
+    """
+    title = unicodedata.normalize("NFKD", title)
+    title = "".join(c for c in title if not unicodedata.combining(c))
+    title = " ".join(re.split(r"[\W_]+", title.lower())).strip()
+    return re.sub(r"(?<!\d)0+(?=\d)", "", title)
+
+
+def trigrams(normalized: str) -> Set[str]:
+    """Trigrams of every word of a normalized title, each word padded like
+    pg_trgm with two spaces in front and one after
+
+    Args:
+        normalized (str): Output of normalize_title
+
+    Returns:
+        Set[str]: The trigrams
+    """
+    grams = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def numbers(normalized: str) -> Tuple[int, ...]:
+    """Numbers in a normalized title, in order. "crypto 3" and "crypto 03" have
+    the same numbers, "baby rev 2" and "baby rev" do not
+
+    Args:
+        normalized (str): Output of normalize_title
+
+    Returns:
+        Tuple[int, ...]: The numbers
+    """
+    return tuple(int(n) for n in re.findall(r"\d+", normalized))
+
+
+class TaskIndex:
+    """Index of the tasks of an event for matching Mixto entry titles. Titles
+    that are equal once normalized, or once their spaces are removed, match
+    with a confidence of 1. Other titles are compared by trigram similarity
+    (shared trigrams over all trigrams of both titles) through an inverted
+    index, so only tasks sharing a trigram with the title are scored. A fuzzy
+    match needs the same numbers in both titles, as numbered challenges of a
+    series like "crypto 1" and "crypto 3" are otherwise close
+
+    Args:
+        tasks (Dict[str, str]): Task name to task path, in page order
+        threshold (float, optional): Minimum similarity of a fuzzy match.
+            Defaults to DEFAULT_THRESHOLD.
+    """
+
+    def __init__(self, tasks: Dict[str, str], threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.paths: List[str] = []
+        self.sizes: List[int] = []
+        self.numbers: List[Tuple[int, ...]] = []
+        # normalized title without spaces -> task number
+        self.exact: Dict[str, int] = {}
+        # trigram -> task numbers
+        self.postings: Dict[str, List[int]] = {}
+        for name, path in tasks.items():
+            n = len(self.paths)
+            normalized = normalize_title(name)
+            grams = trigrams(normalized)
+            self.paths.append(path)
+            self.sizes.append(len(grams))
+            self.numbers.append(numbers(normalized))
+            self.exact.setdefault(normalized.replace(" ", ""), n)
+            for g in grams:
+                self.postings.setdefault(g, []).append(n)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def candidates(self, title: str) -> Dict[int, float]:
+        """Tasks an entry title may match
+
+        Args:
+            title (str): Mixto entry title
+
+        Returns:
+            Dict[int, float]: Task number to confidence, for the task with an equal
+            title and every task reaching the threshold
+        """
+        normalized = normalize_title(title)
+        found: Dict[int, float] = {}
+        n = self.exact.get(normalized.replace(" ", ""))
+        if n is not None:
+            found[n] = 1.0
+
+        grams = trigrams(normalized)
+        title_numbers = numbers(normalized)
+        shared: Dict[int, int] = {}
+        for g in grams:
+            for n in self.postings.get(g, ()):
+                shared[n] = shared.get(n, 0) + 1
+        for n, count in shared.items():
+            if n in found or self.numbers[n] != title_numbers:
+                continue
+            score = count / (len(grams) + self.sizes[n] - count)
+            if score >= self.threshold:
+                found[n] = round(score, 3)
+        return found
+
+    def match(self, title: str) -> Union[Tuple[str, float], None]:
+        """Find the task of an entry title
+
+        Args:
+            title (str): Mixto entry title
+
+        Returns:
+            Union[Tuple[str, float], None]: (task path, confidence between 0 and 1)
+            of the most similar task, or None if no task reaches the threshold
+        """
+        found = self.candidates(title)
+        if not found:
+            return None
+        # ties go to the task listed first
+        n = min(found, key=lambda n: (-found[n], n))
+        return self.paths[n], found[n]
+
+    def match_all(self, titles: Dict[str, str]) -> Dict[str, Tuple[str, float]]:
+        """Match several entries at once, giving every task to at most one entry.
+        Pairs of entry and task are taken best confidence first, so an entry
+        whose closest task went to a better match gets its next closest task
+
+        Args:
+            titles (Dict[str, str]): Entry id to entry title
+
+        Returns:
+            Dict[str, Tuple[str, float]]: Entry id to (task path, confidence) of
+            every matched entry
+        """
+        pairs = [
+            (-score, i, n, key)
+            for i, (key, title) in enumerate(titles.items())
+            for n, score in self.candidates(title).items()
+        ]
+        matched: Dict[str, Tuple[str, float]] = {}
+        taken: Set[int] = set()
+        # ties go to the entry, then the task, listed first
+        for score, _, n, key in sorted(pairs):
+            if key in matched or n in taken:
+                continue
+            matched[key] = (self.paths[n], -score)
+            taken.add(n)
+        return matched
@@ -0,0 +1,270 @@
+import sqlite3
+from hashlib import sha256
+from threading import Lock
+from time import time
+from typing import Any, Iterable, List, Set, Tuple, Union
+
+from archive import compress, decompress
+
+# entry_id, workspace_id, commit_id, writeup, title, created_at
+Row = Tuple[str, str, str, str, str, int]
+
+
+class WriteupStore:
+    """Writeups added to Mixto entries, kept in the ctftime table of mixto.db.
+    The db runs in WAL mode so the http cache and concurrent runs do not block
+    readers, and lookups by workspace use the (workspace_id, entry_id) index.
+    All statements are parameterized. Safe to use from several threads.
+
+    Writeups are recorded in ctftime_pending before their commits are sent,
+    and moved to ctftime with their commit ids in one transaction once Mixto
+    has added them. A pending row left by a crash means the outcome of its
+    commit is unknown and has to be checked with Mixto.
+
+    Archived writeup texts are kept compressed in ctftime_archive, once per
+    sha256 of the text, and ctftime_archive_url maps writeup urls to them
+
+    Args:
+        db_path (str): Path of the sqlite db
+    """
+
+    _table_name = "ctftime"
+
+    def __init__(self, db_path: str):
+        self.lock = Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS '{self._table_name}' (
+                entry_id varchar PRIMARY KEY,
+                workspace_id varchar NOT NULL,
+                commit_id varchar NOT NULL,
+                writeup text NOT NULL,
+                title text NOT NULL,
+                created_at int64 NOT NULL
+            );
+        """
+        )
+        self.db.execute(
+            f"CREATE INDEX IF NOT EXISTS {self._table_name}_workspace_entry "
+            f"ON {self._table_name} (workspace_id, entry_id)"
+        )
+        self.db.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS '{self._table_name}_pending' (
+                entry_id varchar PRIMARY KEY,
+                workspace_id varchar NOT NULL,
+                writeup text NOT NULL,
+                title text NOT NULL,
+                created_at int64 NOT NULL
+            );
+        """
+        )
+        self.db.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS '{self._table_name}_archive' (
+                sha256 varchar PRIMARY KEY,
+                codec varchar NOT NULL,
+                body blob NOT NULL,
+                size int NOT NULL,
+                created_at int64 NOT NULL
+            );
+        """
+        )
+        self.db.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS '{self._table_name}_archive_url' (
+                url text PRIMARY KEY,
+                sha256 varchar NOT NULL,
+                fetched_at int64 NOT NULL
+            );
+        """
+        )
+        self.db.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS lookup (entry_id varchar PRIMARY KEY)"
+        )
+        self.db.commit()
+
+    def get_entry(self, entry_id: str) -> Union[None, Row]:
+        """Get an entry from the db. If entry does not exist, the return value is None
+
+        Args:
+            entry_id (str): Mixto entry id
+
+        Returns:
+            Union[None, Row]: The stored row
+        """
+        with self.lock:
+            return self.db.execute(
+                f"SELECT * FROM {self._table_name} WHERE entry_id = ?", [entry_id]
+            ).fetchone()
+
+    def existing_entry_ids(self, workspace_id: str, entry_ids: Iterable[str]) -> Set[str]:
+        """Which of entry_ids already have a writeup, in one query. The ids go
+        through a temp table, so any number of them can be checked
+
+        Args:
+            workspace_id (str): Workspace of the entries
+            entry_ids (Iterable[str]): Mixto entry ids
+
+        Returns:
+            Set[str]: The entry ids with a stored writeup
+        """
+        with self.lock:
+            self.db.execute("DELETE FROM temp.lookup")
+            self.db.executemany(
+                "INSERT OR IGNORE INTO temp.lookup VALUES (?)", [[e] for e in entry_ids]
+            )
+            rows = self.db.execute(
+                f"""
+                SELECT c.entry_id FROM {self._table_name} c
+                JOIN temp.lookup l ON c.entry_id = l.entry_id
+                WHERE c.workspace_id = ?
+            """,
+                [workspace_id],
+            ).fetchall()
+            self.db.execute("DELETE FROM temp.lookup")
+            self.db.commit()
+        return {r[0] for r in rows}
+
+    def get_entries(self, workspace_id: str) -> List[Tuple[str, str]]:
+        """Get all writeups added for a workspace
+
+        Args:
+            workspace_id (str): Workspace id
+
+        Returns:
+            List[Tuple[str, str]]: title and writeup of every stored entry
+        """
+        with self.lock:
+            return self.db.execute(
+                f"SELECT title, writeup FROM {self._table_name} WHERE workspace_id = ?",
+                [workspace_id],
+            ).fetchall()
+
+    def set_entries(self, entries: List[List[Any]]):
+        """Insert multiple entries in one transaction. Order of values are
+        entry_id, workspace_id, commit_id, writeup, title, int(time())
+
+        Args:
+            entries (List[List[Any]]): Array of rows
+        """
+        with self.lock, self.db:
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO {self._table_name} VALUES (?,?,?,?,?,?)",
+                entries,
+            )
+
+    def set_pending(self, pending: List[List[Any]]):
+        """Record writeups whose commits are about to be sent. Order of values are
+        entry_id, workspace_id, writeup, title, int(time())
+
+        Args:
+            pending (List[List[Any]]): Array of rows
+        """
+        with self.lock, self.db:
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO {self._table_name}_pending VALUES (?,?,?,?,?)",
+                pending,
+            )
+
+    def get_pending(self, workspace_id: str) -> List[Tuple[str, str, str]]:
+        """Get the writeups of a workspace whose commits were sent without their
+        outcome being recorded
+
+        Args:
+            workspace_id (str): Workspace id
+
+        Returns:
+            List[Tuple[str, str, str]]: entry_id, writeup and title of every pending row
+        """
+        with self.lock:
+            return self.db.execute(
+                f"SELECT entry_id, writeup, title FROM {self._table_name}_pending WHERE workspace_id = ?",
+                [workspace_id],
+            ).fetchall()
+
+    def complete(self, entries: List[List[Any]]):
+        """Record added writeups and clear their pending rows in one transaction.
+        Order of values are the same as set_entries
+
+        Args:
+            entries (List[List[Any]]): Array of rows
+        """
+        with self.lock, self.db:
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO {self._table_name} VALUES (?,?,?,?,?,?)",
+                entries,
+            )
+            self.db.executemany(
+                f"DELETE FROM {self._table_name}_pending WHERE entry_id = ?",
+                [[e[0]] for e in entries],
+            )
+
+    def drop_pending(self, entry_ids: List[str]):
+        """Clear pending rows whose commits turned out not to be added"""
+        with self.lock, self.db:
+            self.db.executemany(
+                f"DELETE FROM {self._table_name}_pending WHERE entry_id = ?",
+                [[e] for e in entry_ids],
+            )
+
+    def get_archive(self, url: str) -> Union[str, None]:
+        """Get the archived text of a writeup url. None if the url was not archived,
+        or was archived with zstd and zstandard is not installed
+
+        Args:
+            url (str): Writeup url
+
+        Returns:
+            Union[str, None]: The archived text
+        """
+        with self.lock:
+            row = self.db.execute(
+                f"""
+                SELECT a.codec, a.body FROM {self._table_name}_archive_url u
+                JOIN {self._table_name}_archive a ON a.sha256 = u.sha256
+                WHERE u.url = ?
+            """,
+                [url],
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return decompress(*row)
+        except ValueError:
+            return None
+
+    def set_archives(self, archives: List[Tuple[str, str]]) -> List[str]:
+        """Archive writeup texts in one transaction. A text that is already stored,
+        for any url, is not stored again
+
+        Args:
+            archives (List[Tuple[str, str]]): (url, text) pairs
+
+        Returns:
+            List[str]: sha256 of every text, in the order of archives
+        """
+        now = int(time())
+        hashes = [sha256(text.encode()).hexdigest() for _, text in archives]
+        with self.lock, self.db:
+            for (url, text), digest in zip(archives, hashes):
+                stored = self.db.execute(
+                    f"SELECT 1 FROM {self._table_name}_archive WHERE sha256 = ?", [digest]
+                ).fetchone()
+                if stored is None:
+                    codec, body = compress(text)
+                    self.db.execute(
+                        f"INSERT INTO {self._table_name}_archive VALUES (?,?,?,?,?)",
+                        [digest, codec, body, len(text.encode()), now],
+                    )
+                self.db.execute(
+                    f"INSERT OR REPLACE INTO {self._table_name}_archive_url VALUES (?,?,?)",
+                    [url, digest, now],
+                )
+        return hashes
+
+    def close(self):
+        self.db.close()
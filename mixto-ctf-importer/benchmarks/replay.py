@@ -0,0 +1,277 @@
+"""
+Replay benchmark of the import pipeline. Recorded CTFd, rCTF, Pico and HTB
+responses in benchmarks/fixtures are scaled up to the requested number of
+challenges and served, together with a stand-in Mixto API, from a local
+http server. Each platform runs process_challenges_to_entries and then
+batch_create_entries, and the time, peak python memory and requests of
+both stages are reported. The server runs in its own process so it is
+not part of the measurements.
+
+    python benchmarks/replay.py [--challenges 10000] [--platform ctfd] [--details]
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import tracemalloc
+from collections import Counter
+from contextlib import redirect_stdout
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Process, Queue
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, List, Tuple
+from urllib.parse import parse_qs, urlparse
+from urllib.request import urlopen
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from lib.mixto import CreateMixtoEntries, MixtoConfig  # noqa: E402
+from lib.registry import load_platform  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+WORKSPACE = "replay"
+CATEGORIES = ["web", "pwn", "crypto", "rev", "forensics", "misc", "other"]
+
+# platform -> auth that skips the prompts
+AUTH = {
+    "ctfd": {"session": "replay"},
+    "rctf": {"token": "replay"},
+    "pico": {"sessionid": "replay", "csrftoken": "replay", "original_event": "1"},
+    "htb": {"event_id": "512", "token": "replay"},
+}
+
+
+def scale(items: List[dict], n: int, id_key: str = "id") -> List[dict]:
+    """
+    Repeat the recorded items up to n, giving each copy a unique id and name.
+    """
+    out = []
+    for i in range(n):
+        item = deepcopy(items[i % len(items)])
+        item["name"] = f"{item['name']} {i}"
+        if id_key in item:
+            item[id_key] = i + 1 if isinstance(item[id_key], int) else f"{item[id_key]}-{i}"
+        out.append(item)
+    return out
+
+
+class ReplayServer:
+    """
+    Serves the scaled fixtures of every platform and a stand-in Mixto API on
+    a free local port, and counts requests by route. GET /_counts returns
+    the counts since the last call and resets them.
+    """
+
+    def __init__(self, challenges: int) -> None:
+        ctfd = json.loads((FIXTURES / "ctfd.json").read_text())
+        rctf = json.loads((FIXTURES / "rctf.json").read_text())
+        pico = json.loads((FIXTURES / "pico.json").read_text())
+        htb = json.loads((FIXTURES / "htb.json").read_text())
+
+        self.ctfd_list = {**ctfd["list"], "data": scale(ctfd["list"]["data"], challenges)}
+        self.ctfd_detail = ctfd["detail"]
+        self.rctf = {**rctf, "data": scale(rctf["data"], challenges)}
+        self.pico = pico
+        self.pico_results = scale(pico["results"], challenges)
+        self.htb = {**htb, "challenges": scale(htb["challenges"], challenges)}
+
+        self.requests = Counter()
+        self.lock = Lock()
+        self.entry_id = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+
+    def count(self, route: str) -> None:
+        with self.lock:
+            self.requests[route] += 1
+
+    def take_counts(self) -> Counter:
+        with self.lock:
+            counts, self.requests = self.requests, Counter()
+        return counts
+
+    def pico_page(self, query: dict) -> dict:
+        page = int(query.get("page", ["1"])[0])
+        size = int(query.get("page_size", ["100"])[0])
+        results = self.pico_results[(page - 1) * size : page * size]
+        return {**self.pico, "count": len(self.pico_results), "results": results}
+
+    def detail(self, challenge_id: int) -> dict:
+        c = self.ctfd_list["data"][challenge_id - 1]
+        data = {**self.ctfd_detail["data"], "id": c["id"], "name": c["name"]}
+        return {**self.ctfd_detail, "data": {**data, "category": c["category"]}}
+
+    def add_entries(self, entries: List[dict]) -> List[dict]:
+        with self.lock:
+            start = self.entry_id
+            self.entry_id += len(entries)
+        return [
+            {**e, "entry_id": f"entry-{start + i}", "workspace": WORKSPACE}
+            for i, e in enumerate(entries)
+        ]
+
+    def handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                # headers and body are written separately, which nagle would delay
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def reply(self, route: str, body: Any, status: int = 200) -> None:
+                server.count(route)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self) -> None:
+                u = urlparse(self.path)
+                parts = u.path.strip("/").split("/")
+                if u.path == "/_counts":
+                    # not counted itself
+                    data = json.dumps(server.take_counts()).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                elif u.path == "/api/v1/challenges":
+                    self.reply("ctfd list", server.ctfd_list)
+                elif u.path.startswith("/api/v1/challenges/"):
+                    self.reply("ctfd detail", server.detail(int(parts[-1])))
+                elif u.path == "/api/v1/challs":
+                    self.reply("rctf list", server.rctf)
+                elif u.path == "/api/challenges/":
+                    self.reply("pico page", server.pico_page(parse_qs(u.query)))
+                elif u.path.startswith("/api/ctf/"):
+                    self.reply("htb list", server.htb)
+                elif u.path.startswith("/api/workspace/"):
+                    self.reply("mixto workspace", {"entries_count": 0})
+                elif u.path.startswith("/api/misc/workspaces/"):
+                    self.reply("mixto entries", [])
+                else:
+                    self.reply("not found", {}, 404)
+
+            def do_PUT(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                self.reply("mixto add entries", server.add_entries(body))
+
+            def do_POST(self) -> None:
+                self.rfile.read(int(self.headers["Content-Length"]))
+                self.reply("mixto commit", {})
+
+            def log_message(self, *args) -> None:
+                pass
+
+        return Handler
+
+
+def _serve(challenges: int, port: Queue) -> None:
+    server = ReplayServer(challenges)
+    port.put(server.httpd.server_port)
+    server.httpd.serve_forever()
+
+
+class ReplayProcess:
+    """
+    Runs a ReplayServer in a child process for the duration of a with block.
+    """
+
+    def __init__(self, challenges: int) -> None:
+        self.challenges = challenges
+
+    def __enter__(self) -> "ReplayProcess":
+        port = Queue()
+        self.process = Process(target=_serve, args=(self.challenges, port), daemon=True)
+        self.process.start()
+        self.url = f"http://127.0.0.1:{port.get()}"
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.process.terminate()
+        self.process.join()
+
+    def take_counts(self) -> Counter:
+        """
+        Returns the request counts since the last call and resets them.
+        """
+        with urlopen(f"{self.url}/_counts") as r:
+            return Counter(json.load(r))
+
+
+def run_stage(
+    server: ReplayProcess, make: Callable[[], Callable[[], Any]]
+) -> Tuple[Any, float, float, Counter]:
+    """
+    Run the function returned by make twice with its output discarded, first
+    for the time and requests, then under tracemalloc, which slows requests
+    down several times, for the peak memory. make returns a function over
+    fresh objects so the second run does not reuse caches of the first.
+    Returns the result, seconds, peak traced memory in MB and the requests.
+    """
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        server.take_counts()
+        start = perf_counter()
+        result = make()()
+        seconds = perf_counter() - start
+        counts = server.take_counts()
+
+        fn = make()
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return result, seconds, peak, counts
+
+
+def report(platform: str, stage: str, seconds: float, peak: float, counts: Counter) -> None:
+    requests = ", ".join(f"{k} {v}" for k, v in sorted(counts.items()))
+    print(
+        f"{platform:<5} {stage:<7} {seconds:7.2f}s {peak:8.1f} MB "
+        f"{sum(counts.values()):6} requests ({requests})"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--challenges", type=int, default=10000)
+    parser.add_argument(
+        "--platform", choices=sorted(AUTH), action="append", help="Defaults to all"
+    )
+    parser.add_argument("--details", action="store_true", default=False)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=50)
+    args = parser.parse_args()
+
+    with ReplayProcess(args.challenges) as server:
+        config = MixtoConfig(
+            api_key="replay", categories=CATEGORIES, host=server.url, workspace=WORKSPACE
+        )
+        checkpoint = str(FIXTURES.parent / ".replay-checkpoint")
+        for name in args.platform or sorted(AUTH):
+
+            def fetch() -> Callable[[], Any]:
+                platform = load_platform(name)(server.url, config, AUTH[name])
+                platform.details = args.details
+                platform.workers = args.workers
+                return platform.process_challenges_to_entries
+
+            def upload() -> Callable[[], Any]:
+                mixto = CreateMixtoEntries(config=config)
+                return lambda: mixto.batch_create_entries(
+                    entries, args.chunk_size, args.workers, checkpoint, False
+                )
+
+            entries, seconds, peak, counts = run_stage(server, fetch)
+            report(name, "fetch", seconds, peak, counts)
+            _, seconds, peak, counts = run_stage(server, upload)
+            report(name, "upload", seconds, peak, counts)
@@ -0,0 +1,91 @@
+"""
+Import-time benchmark of the importer CLI. Runs each mode under
+python -X importtime and fails when the imports it adds on top of a bare
+interpreter exceed the budget, or when a mode imports a platform module it
+did not select.
+
+    python benchmarks/startup.py [--runs 5] [--help-budget 50] [--json-budget 500]
+"""
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+from statistics import median
+from typing import Dict, List, Set, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+PLATFORM_MODULES = {"lib.ctfd", "lib.htb", "lib.pico", "lib.rctf"}
+
+
+def import_times(args: List[str]) -> Tuple[Dict[str, int], Set[str]]:
+    """
+    Cumulative import time in microseconds of each top level import, and
+    the names of all imported modules.
+    """
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    times = {}
+    modules = set()
+    for line in p.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        modules.add(name.strip())
+        # nested imports are indented and already part of their parent
+        if not name[1:].startswith(" "):
+            times[name.strip()] = int(cumulative)
+    return times, modules
+
+
+def measure(args: List[str], runs: int) -> Tuple[float, Set[str]]:
+    """
+    Median import time in milliseconds that args adds to a bare interpreter,
+    and the modules it imported.
+    """
+    totals = []
+    for _ in range(runs):
+        base, _ = import_times(["-c", "pass"])
+        times, modules = import_times(args)
+        totals.append(sum(v for k, v in times.items() if k not in base) / 1000)
+    return median(totals), modules
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--help-budget", help="Budget of --help in ms", type=float, default=50
+    )
+    parser.add_argument(
+        "--json-budget",
+        help="Budget of the imports of a --json run in ms",
+        type=float,
+        default=500,
+    )
+    args = parser.parse_args()
+
+    modes = [
+        ("--help", ["mixto_ctf_importer.py", "--help"], args.help_budget),
+        # what a --json run imports before it reads the mixto config
+        (
+            "--json",
+            ["-c", "import lib.registry, lib.mixto, lib.custom"],
+            args.json_budget,
+        ),
+    ]
+    failed = False
+    for name, cmd, budget in modes:
+        ms, modules = measure(cmd, args.runs)
+        loaded = sorted(PLATFORM_MODULES & modules)
+        ok = ms <= budget and not loaded
+        failed = failed or not ok
+        print(
+            f"{name:<8} {ms:7.1f} ms (budget {budget:.0f} ms)"
+            + (f" imported {', '.join(loaded)}" if loaded else "")
+            + ("" if ok else " FAIL")
+        )
+    sys.exit(1 if failed else 0)
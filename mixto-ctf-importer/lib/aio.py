@@ -0,0 +1,397 @@
+"""
+Asyncio counterpart of the importer, built on aiohttp. Platforms implement
+AsyncGetAndProcessChallenges, and run_targets imports several targets at
+once. Every target runs its own fetch -> enrich -> upload pipeline with
+bounded queues between the stages, so a slow platform only slows itself.
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from collections import deque
+from itertools import islice
+from math import ceil
+from time import perf_counter
+from typing import Any, AsyncIterator, Dict, List, Optional
+from urllib.parse import urljoin
+
+import aiohttp
+
+from .mixto import MIXTO_USER_AGENT, MixtoConfig, MixtoEntry
+from .multi import ImportTarget, TargetReport
+from .r_types import default_headers
+from .registry import load_platform
+from .session import RETRY_STATUSES
+
+# marks the end of a queue
+_DONE = object()
+
+
+async def request_json(
+    session: aiohttp.ClientSession, method: str, url: str, retries: int = 3, **kwargs
+) -> Any:
+    """
+    Send a request and return the decoded json. Like new_session, only GET and
+    HEAD are retried with exponential backoff on connection errors and
+    RETRY_STATUSES. Any other status of 400 or above raises.
+    """
+    attempts = retries + 1 if method in ("GET", "HEAD") else 1
+    for attempt in range(attempts):
+        last = attempt == attempts - 1
+        try:
+            async with session.request(method, url, **kwargs) as r:
+                if r.status >= 400 and (last or r.status not in RETRY_STATUSES):
+                    raise Exception(f"{r.status} {r.reason}")
+                if r.status < 400:
+                    return await r.json(content_type=None)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if last:
+                raise
+        await asyncio.sleep(0.5 * 2 ** attempt)
+
+
+def new_session(
+    headers: dict = None, pool_size: int = 10, verify: bool = True
+) -> aiohttp.ClientSession:
+    """
+    Create an aiohttp session keeping up to pool_size connections open.
+    Must be called with an event loop running.
+    """
+    connector = aiohttp.TCPConnector(limit=pool_size, ssl=None if verify else False)
+    return aiohttp.ClientSession(headers=headers, connector=connector)
+
+
+class AsyncGetAndProcessChallenges(ABC):
+    """
+    Async version of GetAndProcessChallenges. Implementations take the same
+    (host, config, auth) arguments and prompt with get_auth in __init__, so
+    credentials are collected before the event loop starts. Requests should
+    go through get_json, which uses self.session.
+    """
+
+    headers: dict = default_headers
+    default_host: Optional[str] = None
+    pool_size: int = 10
+    retries: int = 3
+    # verify tls certificates
+    verify: bool = True
+    _session: Optional[aiohttp.ClientSession] = None
+
+    details: bool = False
+    # challenges enriched concurrently
+    workers: int = 8
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """
+        Session owned by this platform instance, created on first use.
+        """
+        if self._session is None:
+            self._session = new_session(
+                self.headers, max(self.pool_size, self.workers), self.verify
+            )
+        return self._session
+
+    async def get_json(self, url: str, **kwargs) -> Any:
+        return await request_json(self.session, "GET", url, self.retries, **kwargs)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @abstractmethod
+    def get_auth(self) -> dict:
+        """
+        Prompt for credentials.
+        """
+        pass
+
+    @abstractmethod
+    def get_challenges(self) -> AsyncIterator[Any]:
+        """
+        Yield challenges as the ctf platform returns them.
+        """
+        pass
+
+    @abstractmethod
+    async def to_entry(self, challenge: Any) -> MixtoEntry:
+        """
+        Process one challenge as a Mixto entry, fetching its details if enabled.
+        """
+        pass
+
+    async def process_challenges_to_entries(self) -> List[MixtoEntry]:
+        """
+        Process all challenges, up to workers at a time.
+        """
+        challenges = [c async for c in self.get_challenges()]
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def one(c: Any) -> MixtoEntry:
+            async with semaphore:
+                return await self.to_entry(c)
+
+        return list(await asyncio.gather(*[one(c) for c in challenges]))
+
+
+async def apaginate(
+    platform: AsyncGetAndProcessChallenges,
+    url: str,
+    params: dict,
+    page_size: int = 100,
+    results_key: str = "results",
+) -> AsyncIterator[Any]:
+    """
+    Async version of paginate. Pages after the first are requested
+    concurrently, up to platform.workers at a time, and yielded in order.
+    The number of pages is worked out from the size of the first page.
+    """
+    params = {**params, "page_size": page_size}
+    page = await platform.get_json(url, params={**params, "page": 1})
+    for item in page[results_key]:
+        yield item
+
+    count = page.get("count")
+    served = len(page[results_key])
+    if count is not None and served:
+
+        def get(n: int) -> asyncio.Future:
+            return asyncio.ensure_future(
+                platform.get_json(url, params={**params, "page": n})
+            )
+
+        pages = iter(range(2, ceil(count / served) + 1))
+        pending = deque(get(n) for n in islice(pages, platform.workers))
+        try:
+            while pending:
+                p = await pending.popleft()
+                n = next(pages, None)
+                if n is not None:
+                    pending.append(get(n))
+                for item in p[results_key]:
+                    yield item
+        finally:
+            for p in pending:
+                p.cancel()
+        return
+
+    next_url = page.get("next")
+    while next_url:
+        page = await platform.get_json(next_url)
+        for item in page[results_key]:
+            yield item
+        next_url = page.get("next")
+
+
+class AsyncMixtoUploader:
+    """
+    Adds entries to a workspace over an aiohttp session, like
+    CreateMixtoEntries.upload_entries.
+    """
+
+    def __init__(
+        self,
+        config: MixtoConfig,
+        workspace: str,
+        pool_size: int = 10,
+        workers: int = 8,
+    ) -> None:
+        self.config = config
+        self.workspace = workspace
+        self.pool_size = pool_size
+        self.workers = workers
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = new_session(
+                {"x-api-key": self.config.api_key, "User-Agent": MIXTO_USER_AGENT},
+                self.pool_size,
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def upload_entries(self, entries: List[MixtoEntry]) -> List[dict]:
+        """
+        Add entries and then their first commits, up to workers at a time.
+        Returns the entries as created by Mixto.
+        """
+        url = urljoin(self.config.host, f"/api/entry/{self.workspace}")
+        added = await request_json(
+            self.session,
+            "PUT",
+            url,
+            json=[{"title": e["title"], "category": e["category"]} for e in entries],
+        )
+        commits = {e["title"]: e["commit"] for e in entries if e.get("commit")}
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def add(entry: dict) -> None:
+            url = urljoin(
+                self.config.host,
+                f"/api/entry/{self.workspace}/{entry['entry_id']}/commit",
+            )
+            data = {
+                "data": commits[entry["title"]],
+                "type": "dump",
+                "title": "Challenge details",
+            }
+            async with semaphore:
+                try:
+                    await request_json(self.session, "POST", url, json=data)
+                except Exception as e:
+                    print(f"Failed to add details to {entry['title']}: {e}")
+
+        await asyncio.gather(*[add(e) for e in added if e["title"] in commits])
+        return added
+
+
+async def run_pipeline(
+    platform: AsyncGetAndProcessChallenges,
+    uploader: AsyncMixtoUploader,
+    report: TargetReport,
+    chunk_size: int = 50,
+    queue_size: int = 100,
+    uploads: int = 4,
+) -> None:
+    """Import one target as three concurrent stages.
+
+    The fetch stage puts challenges on a queue, platform.workers enrich
+    tasks turn them into entries, and the upload stage sends entries in
+    chunks of chunk_size with up to uploads chunks in flight. Queues hold at
+    most queue_size items, so a stage that falls behind slows the stages
+    before it instead of buffering everything. The first error stops the
+    target and is recorded in report.
+
+    Args:
+        platform (AsyncGetAndProcessChallenges): The platform to import
+        uploader (AsyncMixtoUploader): Uploader of the target's workspace
+        report (TargetReport): Receives the counts, timings and error
+        chunk_size (int, optional): Entries per upload request. Defaults to 50.
+        queue_size (int, optional): Capacity of each queue. Defaults to 100.
+        uploads (int, optional): Chunks in flight. Defaults to 4.
+    """
+    challenges: asyncio.Queue = asyncio.Queue(queue_size)
+    entries: asyncio.Queue = asyncio.Queue(queue_size)
+    start = perf_counter()
+
+    async def fetch() -> None:
+        try:
+            async for c in platform.get_challenges():
+                report.fetched += 1
+                await challenges.put(c)
+        finally:
+            report.fetch_seconds = perf_counter() - start
+        for _ in range(platform.workers):
+            await challenges.put(_DONE)
+
+    async def enrich() -> None:
+        while True:
+            c = await challenges.get()
+            if c is _DONE:
+                break
+            await entries.put(await platform.to_entry(c))
+        await entries.put(_DONE)
+
+    async def upload() -> None:
+        semaphore = asyncio.Semaphore(uploads)
+        sending: List[asyncio.Future] = []
+
+        async def send(chunk: List[MixtoEntry]) -> None:
+            try:
+                added = await uploader.upload_entries(chunk)
+                report.added += len(added)
+            finally:
+                semaphore.release()
+
+        async def submit(chunk: List[MixtoEntry]) -> None:
+            await semaphore.acquire()
+            # stop at the first failed chunk
+            for f in sending:
+                if f.done() and f.exception() is not None:
+                    raise f.exception()
+            sending.append(asyncio.ensure_future(send(chunk)))
+
+        try:
+            chunk = []
+            remaining = platform.workers
+            while remaining:
+                e = await entries.get()
+                if e is _DONE:
+                    remaining -= 1
+                    continue
+                chunk.append(e)
+                if len(chunk) == chunk_size:
+                    await submit(chunk)
+                    chunk = []
+            if chunk:
+                await submit(chunk)
+            await asyncio.gather(*sending)
+        except BaseException:
+            for f in sending:
+                f.cancel()
+            raise
+
+    stages = [asyncio.ensure_future(fetch()), asyncio.ensure_future(upload())]
+    stages += [asyncio.ensure_future(enrich()) for _ in range(platform.workers)]
+    done, pending = await asyncio.wait(stages, return_when=asyncio.FIRST_EXCEPTION)
+    for t in pending:
+        t.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    errors = [t.exception() for t in done if t.exception() is not None]
+    if errors:
+        report.error = str(errors[0])
+    report.upload_seconds = perf_counter() - start
+
+
+def run_targets(
+    targets: List[ImportTarget],
+    config: MixtoConfig,
+    workers: int = 8,
+    pool_size: int = 10,
+    retries: int = 3,
+    chunk_size: int = 50,
+    queue_size: int = 100,
+) -> List[TargetReport]:
+    """
+    Import all targets concurrently with run_pipeline. Platforms are created,
+    and missing credentials prompted for, before the event loop starts.
+    Targets sharing a workspace share its uploader.
+    """
+    platforms = []
+    for t in targets:
+        platform = load_platform(t.platform, asynchronous=True)(t.host, config, t.auth)
+        platform.details = t.details
+        platform.workers = workers
+        platform.pool_size = pool_size
+        platform.retries = retries
+        platforms.append(platform)
+    reports = [
+        TargetReport(target=t, workspace=t.workspace or config.workspace)
+        for t in targets
+    ]
+
+    async def main() -> None:
+        uploaders: Dict[str, AsyncMixtoUploader] = {}
+        for r in reports:
+            if r.workspace not in uploaders:
+                uploaders[r.workspace] = AsyncMixtoUploader(
+                    config, r.workspace, pool_size, workers
+                )
+        try:
+            await asyncio.gather(
+                *[
+                    run_pipeline(p, uploaders[r.workspace], r, chunk_size, queue_size)
+                    for p, r in zip(platforms, reports)
+                ]
+            )
+        finally:
+            for s in [*platforms, *uploaders.values()]:
+                await s.close()
+
+    asyncio.run(main())
+    return reports
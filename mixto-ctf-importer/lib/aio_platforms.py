@@ -0,0 +1,181 @@
+"""
+Async implementations of the built-in platforms. Responses are parsed with
+the models of the synchronous platforms.
+"""
+from typing import AsyncIterator
+from urllib.parse import urljoin
+
+from .aio import AsyncGetAndProcessChallenges, apaginate
+from .ctfd import CTFdChallenge, CTFdDetailResponse, CTFdResponse
+from .htb import HTBCategories, HTBChallenge, HTBResponse
+from .mixto import MixtoConfig, MixtoEntry
+from .pico import PicoChallenge
+from .r_types import challenge_commit, default_headers, validate_dict
+from .rctf import RctfChallenge, RctfResponse
+
+
+class AsyncCTFd(AsyncGetAndProcessChallenges):
+    host: str = ""
+    config: MixtoConfig = None
+    verify = False
+
+    def __init__(self, host: str, config: MixtoConfig, auth: dict = None) -> None:
+        super().__init__()
+        self.host = host
+        self.config = config
+        cookies = auth if auth is not None else self.get_auth()
+        self.headers = dict(default_headers)
+        self.headers["Cookie"] = f"session={cookies['session']}"
+
+    def get_auth(self) -> dict:
+        c = {}
+        c["session"] = input("Value for session cookie: ")
+        validate_dict(c)
+        return c
+
+    async def get_challenges(self) -> AsyncIterator[CTFdChallenge]:
+        url = urljoin(self.host, "/api/v1/challenges")
+        try:
+            data = await self.get_json(url)
+        except Exception as e:
+            raise Exception(f"Failed to get challenges: {e}")
+        for c in CTFdResponse(**data).data:
+            yield c
+
+    async def to_entry(self, challenge: CTFdChallenge) -> MixtoEntry:
+        if challenge.category in self.config.categories:
+            entry = {"title": challenge.name, "category": challenge.category}
+        else:
+            entry = {"title": challenge.name, "category": "other"}
+        if self.details:
+            url = urljoin(self.host, f"/api/v1/challenges/{challenge.id}")
+            try:
+                d = CTFdDetailResponse(**await self.get_json(url)).data
+                entry["commit"] = challenge_commit(
+                    self.host, d.name, d.description, d.value, d.files
+                )
+            except Exception as e:
+                print(f"Failed to get details for {challenge.name}: {e}")
+        return entry
+
+
+class AsyncRCTF(AsyncGetAndProcessChallenges):
+    host: str = ""
+    config: MixtoConfig = None
+
+    def __init__(self, host: str, config: MixtoConfig, auth: dict = None) -> None:
+        super().__init__()
+        self.host = host
+        self.config = config
+        info = auth if auth is not None else self.get_auth()
+        self.headers = dict(default_headers)
+        self.headers["Authorization"] = f"Bearer {info['token']}"
+
+    def get_auth(self) -> dict:
+        c = {}
+        c["token"] = input("Bearer Token: ")
+        validate_dict(c)
+        return c
+
+    async def get_challenges(self) -> AsyncIterator[RctfChallenge]:
+        url = urljoin(self.host, "/api/v1/challs")
+        try:
+            data = await self.get_json(url)
+        except Exception as e:
+            raise Exception(f"Failed to get challenges: {e}")
+        for c in RctfResponse(**data).data:
+            yield c
+
+    async def to_entry(self, challenge: RctfChallenge) -> MixtoEntry:
+        if challenge.category in self.config.categories:
+            entry = {"title": challenge.name, "category": challenge.category}
+        else:
+            entry = {"title": challenge.name, "category": "other"}
+        # the challenge list already carries the details
+        if self.details:
+            entry["commit"] = challenge_commit(
+                self.host,
+                challenge.name,
+                challenge.description,
+                challenge.points,
+                [f.url for f in challenge.files],
+            )
+        return entry
+
+
+class AsyncPicoCTF(AsyncGetAndProcessChallenges):
+    default_host = "https://play.picoctf.org"
+    host: str = ""
+    config: MixtoConfig = None
+
+    def __init__(self, host: str, config: MixtoConfig, auth: dict = None) -> None:
+        super().__init__()
+        self.host = host
+        self.config = config
+        get_cookies = auth if auth is not None else self.get_auth()
+        cookies = {
+            "csrftoken": get_cookies["csrftoken"],
+            "sessionid": get_cookies["sessionid"],
+        }
+        self.headers = dict(default_headers)
+        self.headers["cookie"] = "; ".join([f"{k}={v}" for k, v in cookies.items()])
+        self.event_id = get_cookies["original_event"]
+
+    def get_auth(self) -> dict:
+        c = {}
+        c["sessionid"] = input("Value for sessionid cookie: ")
+        c["csrftoken"] = input("Value for csrftoken cookie: ")
+        c["original_event"] = input("Original event ID from URL: ")
+        validate_dict(c)
+        return c
+
+    async def get_challenges(self) -> AsyncIterator[PicoChallenge]:
+        url = urljoin(self.host, "/api/challenges/")
+        try:
+            async for c in apaginate(self, url, {"original_event": self.event_id}):
+                yield PicoChallenge(**c)
+        except Exception as e:
+            raise Exception(f"Failed to get challenges: {e}")
+
+    async def to_entry(self, challenge: PicoChallenge) -> MixtoEntry:
+        category = challenge.category.name.lower()
+        if category in self.config.categories:
+            return {"title": challenge.name, "category": category}
+        return {"title": challenge.name, "category": "other"}
+
+
+class AsyncHtbCTF(AsyncGetAndProcessChallenges):
+    default_host = "https://ctf-api.hackthebox.com"
+    host: str = ""
+    config: MixtoConfig = None
+
+    def __init__(self, host: str, config: MixtoConfig, auth: dict = None) -> None:
+        super().__init__()
+        self.host = host
+        self.config = config
+        info = auth if auth is not None else self.get_auth()
+        self.headers = dict(default_headers)
+        self.headers["Authorization"] = f"Bearer {info['token']}"
+        self.event_id = info["event_id"]
+
+    def get_auth(self) -> dict:
+        c = {}
+        c["event_id"] = input("Event ID: ")
+        c["token"] = input("Bearer Token: ")
+        validate_dict(c)
+        return c
+
+    async def get_challenges(self) -> AsyncIterator[HTBChallenge]:
+        url = urljoin(self.host, f"/api/ctf/{self.event_id}")
+        try:
+            data = await self.get_json(url)
+        except Exception as e:
+            raise Exception(f"Failed to get challenges: {e}")
+        for c in HTBResponse(**data).challenges:
+            yield c
+
+    async def to_entry(self, challenge: HTBChallenge) -> MixtoEntry:
+        return {
+            "title": challenge.name,
+            "category": HTBCategories[challenge.challenge_category_id],
+        }
@@ -0,0 +1,171 @@
+"""
+Download challenge attachments into a directory. Files are stored once per
+SHA-256, and an index in the directory lets later runs skip files that were
+already downloaded.
+"""
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from typing import BinaryIO, Callable, ContextManager, Dict, List, Optional
+from urllib.parse import unquote, urlparse
+
+from pydantic import BaseModel
+
+from .mixto import MixtoEntry
+
+# bytes read and written at a time
+CHUNK_SIZE = 64 * 1024
+INDEX_FILE = ".attachments.json"
+# longest file name most file systems accept, in bytes
+MAX_NAME_BYTES = 255
+
+
+class Attachment(BaseModel):
+    name: str
+    size: int
+    sha256: str
+    path: str
+
+
+def attachment_key(url: str) -> str:
+    """
+    url without its query, as CTFd file tokens differ between sessions.
+    """
+    u = urlparse(url)
+    return f"{u.scheme}://{u.netloc}{u.path}"
+
+
+def safe_name(name: str) -> str:
+    """
+    File name for an attachment that stays inside its directory. Path
+    separators, control and reserved characters become _, leading dots are
+    dropped, and long names are cut to MAX_NAME_BYTES keeping the extension.
+    """
+    name = re.sub(r'[\x00-\x1f\x7f/\\:*?"<>|]', "_", name).strip().lstrip(".")
+    if len(name.encode()) > MAX_NAME_BYTES:
+        suffix = Path(name).suffix[:16]
+        stem = name[: len(name) - len(suffix)]
+        limit = MAX_NAME_BYTES - len(suffix.encode())
+        stem = stem.encode()[:limit].decode(errors="ignore")
+        name = stem + suffix
+    return name or "attachment"
+
+
+def manifest_commit(attachments: List[Attachment]) -> str:
+    """Format attachments as the markdown body of an entry's manifest commit."""
+    rows = [
+        f"| {a.name} | {a.size} | `{a.sha256}` | {a.path} |" for a in attachments
+    ]
+    return "\n".join(["| Name | Size | SHA-256 | Path |", "|---|---|---|---|", *rows])
+
+
+class AttachmentStore:
+    """
+    Downloads attachments into directory as <first 16 hex of sha256>/<name>.
+    A file whose content is already stored is not stored again. open_url
+    opens a url for reading, usually a platform's open_attachment.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        open_url: Callable[[str], ContextManager[BinaryIO]],
+        workers: int = 8,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> None:
+        self.directory = Path(directory).resolve()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.open_url = open_url
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.lock = Lock()
+        # attachment_key -> attachment
+        self.index: Dict[str, Attachment] = {}
+        index_path = self.directory / INDEX_FILE
+        if index_path.exists():
+            for k, v in json.loads(index_path.read_text()).items():
+                self.index[k] = Attachment(**v)
+        # sha256 -> attachment
+        self.by_hash = {a.sha256: a for a in self.index.values()}
+
+    def save(self) -> None:
+        with self.lock:
+            data = {k: a.dict() for k, a in self.index.items()}
+        tmp = self.directory / (INDEX_FILE + ".tmp")
+        tmp.write_text(json.dumps(data, indent=2))
+        tmp.replace(self.directory / INDEX_FILE)
+
+    def download(self, url: str) -> Attachment:
+        """
+        Download url in chunks of chunk_size, hashing while writing, unless
+        the index already has it.
+        """
+        key = attachment_key(url)
+        with self.lock:
+            known = self.index.get(key)
+        if known is not None and Path(known.path).exists():
+            return known
+
+        name = safe_name(unquote(Path(urlparse(url).path).name))
+        h = sha256()
+        size = 0
+        with NamedTemporaryFile(dir=self.directory, prefix=".part-", delete=False) as tmp:
+            try:
+                with self.open_url(url) as f:
+                    for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                        h.update(chunk)
+                        tmp.write(chunk)
+                        size += len(chunk)
+            except BaseException:
+                tmp.close()
+                os.unlink(tmp.name)
+                raise
+
+        digest = h.hexdigest()
+        with self.lock:
+            stored = self.by_hash.get(digest)
+            if stored is not None and Path(stored.path).exists():
+                os.unlink(tmp.name)
+                path = stored.path
+            else:
+                target = self.directory / digest[:16] / name
+                target.parent.mkdir(exist_ok=True)
+                os.replace(tmp.name, target)
+                path = str(target)
+            a = Attachment(name=name, size=size, sha256=digest, path=path)
+            self.index[key] = a
+            self.by_hash.setdefault(digest, a)
+        return a
+
+    def download_entries(self, entries: List[MixtoEntry]) -> None:
+        """
+        Download the files of all entries, up to workers at a time, and set
+        the manifest of every entry with files. Failed downloads are reported
+        and left out of the manifests.
+        """
+        urls = list({u: None for e in entries for u in e.get("files") or []})
+
+        def get(url: str) -> Optional[Attachment]:
+            try:
+                return self.download(url)
+            except Exception as e:
+                print(f"Failed to download {url}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            downloaded = dict(zip(urls, pool.map(get, urls)))
+        self.save()
+
+        for e in entries:
+            attachments = [downloaded[u] for u in e.get("files") or [] if downloaded[u]]
+            if attachments:
+                e["manifest"] = manifest_commit(attachments)
+        print(
+            f"Attachments: {len([a for a in downloaded.values() if a])} of {len(urls)}, "
+            f"{len({a.sha256 for a in downloaded.values() if a})} unique"
+        )
@@ -1,17 +1,20 @@
-from typing import List
-from urllib.parse import urljoin
+from typing import BinaryIO, Dict, Iterator, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urljoin, urlparse
 from pydantic import BaseModel
 
 from .mixto import MixtoConfig, MixtoEntry
 from .r_types import (
     default_headers,
     GetAndProcessChallenges,
+    challenge_commit,
     validate_dict,
 )
-import requests
 
 
 class CTFdChallenge(BaseModel):
+    id: int
     name: str
     category: str
 
@@ -21,15 +24,33 @@ class CTFdResponse(BaseModel):
     data: List[CTFdChallenge]
 
 
+class CTFdChallengeDetail(BaseModel):
+    id: int
+    name: str
+    category: str
+    description: str = ""
+    value: int = 0
+    files: List[str] = []
+
+
+class CTFdDetailResponse(BaseModel):
+    success: bool
+    data: CTFdChallengeDetail
+
+
 class CTFd(GetAndProcessChallenges):
     cookies: dict = {}
     host: str = ""
     config: MixtoConfig = None
 
-    def __init__(self, host: str, config: MixtoConfig) -> None:
+    def __init__(self, host: str, config: MixtoConfig, auth: dict = None) -> None:
         super().__init__()
         self.host = host
         self.config = config
+        self.headers = dict(default_headers)
+        self.cookies = auth if auth is not None else self.get_auth()
+        # details already fetched, so repeated polls only request new challenges
+        self._details: Dict[int, CTFdChallengeDetail] = {}
 
     def get_auth(self) -> dict:
         c = {}
@@ -38,23 +59,75 @@ class CTFd(GetAndProcessChallenges):
         return c
 
     def get_challenges(self) -> List[CTFdChallenge]:
-        session_cookie = self.get_auth()["session"]
-        cookies = {"session": session_cookie}
+        cookies = {"session": self.cookies["session"]}
         url = urljoin(self.host, "/api/v1/challenges")
         try:
-            r = requests.get(url, cookies=cookies, headers=default_headers, verify=False)
+            r = self.get(url, cookies=cookies, verify=False)
             if r.status_code >= 400:
                 raise Exception(f"{r.status_code} {r.reason}")
             return CTFdResponse(**r.json()).data
         except Exception as e:
             raise Exception(f"Failed to get challenges: {e}")
 
+    def get_challenge_details(
+        self, challenges: List[CTFdChallenge]
+    ) -> Dict[int, CTFdChallengeDetail]:
+        """
+        Fetch /api/v1/challenges/{id} for all challenges with a bounded worker
+        pool sharing the instance session. Challenges that fail are left out.
+        Details fetched by a previous call are reused.
+        """
+        cookies = {"session": self.cookies["session"]}
+
+        def get(challenge: CTFdChallenge) -> Optional[CTFdChallengeDetail]:
+            url = urljoin(self.host, f"/api/v1/challenges/{challenge.id}")
+            try:
+                r = self.get(url, cookies=cookies, verify=False)
+                if r.status_code >= 400:
+                    raise Exception(f"{r.status_code} {r.reason}")
+                return CTFdDetailResponse(**r.json()).data
+            except Exception as e:
+                print(f"Failed to get details for {challenge.name}: {e}")
+                return None
+
+        missing = [c for c in challenges if c.id not in self._details]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for d in pool.map(get, missing):
+                if d is not None:
+                    self._details[d.id] = d
+        return {c.id: self._details[c.id] for c in challenges if c.id in self._details}
+
+    @contextmanager
+    def open_attachment(self, url: str) -> Iterator[BinaryIO]:
+        """
+        Open a challenge file like the API requests, with the session cookie
+        and without verifying the certificate. The cookie is only sent to the
+        CTFd host, not to external file storage.
+        """
+        same_host = urlparse(url).netloc == urlparse(self.host).netloc
+        cookies = {"session": self.cookies["session"]} if same_host else None
+        with self.session.get(url, cookies=cookies, verify=False, stream=True) as r:
+            r.raise_for_status()
+            # an expired session is redirected to the login page
+            if urlparse(r.url).path.rstrip("/").endswith("/login"):
+                raise Exception("redirected to the login page, check the session cookie")
+            r.raw.decode_content = True
+            yield r.raw
+
     def process_challenges_to_entries(self) -> List[MixtoEntry]:
         hold = []
         challenges = self.get_challenges()
+        details = self.get_challenge_details(challenges) if self.details else {}
         for challenge in challenges:
             if challenge.category in self.config.categories:
-                hold.append({"title": challenge.name, "category": challenge.category})
+                entry = {"title": challenge.name, "category": challenge.category}
             else:
-                hold.append({"title": challenge.name, "category": "other"})
+                entry = {"title": challenge.name, "category": "other"}
+            d = details.get(challenge.id)
+            if d is not None:
+                entry["commit"] = challenge_commit(
+                    self.host, d.name, d.description, d.value, d.files
+                )
+                entry["files"] = [urljoin(self.host, f) for f in d.files]
+            hold.append(entry)
         return hold
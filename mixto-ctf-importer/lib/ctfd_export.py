@@ -0,0 +1,140 @@
+"""
+CTFd export zips as an offline platform. Challenges, hints and files are
+read from the db/*.json tables of the zip and files are opened from its
+uploads/ folder, without extracting the archive.
+"""
+import json
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock
+from typing import BinaryIO, Dict, Iterator, List, Optional
+from zipfile import ZipFile
+
+from pydantic import BaseModel
+
+from .mixto import MixtoConfig, MixtoEntry
+from .r_types import GetAndProcessChallenges, challenge_commit
+
+# optional, streams the challenges table without loading it
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# scheme of the files of export entries, opened with open_attachment
+EXPORT_SCHEME = "ctfd-export:"
+
+
+class ExportChallenge(BaseModel):
+    id: int
+    name: str
+    category: str = ""
+    description: Optional[str] = ""
+    value: Optional[int] = 0
+    state: str = "visible"
+
+
+class ExportHint(BaseModel):
+    challenge_id: int
+    content: str = ""
+    cost: int = 0
+
+
+class ExportFile(BaseModel):
+    type: str = "challenge"
+    location: str
+    challenge_id: Optional[int] = None
+
+
+class CTFdExport(GetAndProcessChallenges):
+    """
+    Reads challenges from a CTFd export zip. The host is the path of the zip.
+    """
+
+    host: str = ""
+    config: MixtoConfig = None
+
+    def __init__(self, host: str, config: MixtoConfig, auth: dict = None) -> None:
+        super().__init__()
+        self.host = host
+        self.config = config
+        self.zip = ZipFile(host)
+        self.lock = Lock()
+
+    def get_auth(self) -> dict:
+        # exports need no credentials
+        return {}
+
+    def rows(self, table: str) -> Iterator[dict]:
+        """
+        Yield the rows of db/{table}.json, or nothing if the export lacks it.
+        """
+        name = f"db/{table}.json"
+        if name not in self.zip.namelist():
+            return
+        with self.zip.open(name) as f:
+            if ijson is not None:
+                yield from ijson.items(f, "results.item", use_float=True)
+            else:
+                yield from json.load(f)["results"]
+
+    def get_challenges(self) -> Iterator[ExportChallenge]:
+        for row in self.rows("challenges"):
+            yield ExportChallenge(**row)
+
+    def get_hints(self) -> Dict[int, List[ExportHint]]:
+        hints = defaultdict(list)
+        for row in self.rows("hints"):
+            h = ExportHint(**row)
+            hints[h.challenge_id].append(h)
+        return hints
+
+    def get_files(self) -> Dict[int, List[ExportFile]]:
+        files = defaultdict(list)
+        for row in self.rows("files"):
+            f = ExportFile(**row)
+            if f.type == "challenge" and f.challenge_id is not None:
+                files[f.challenge_id].append(f)
+        return files
+
+    @contextmanager
+    def open_attachment(self, url: str) -> Iterator[BinaryIO]:
+        """
+        Open a file of the export, url being ctfd-export:<location>.
+        """
+        with self.lock:
+            f = self.zip.open(f"uploads/{url[len(EXPORT_SCHEME):]}")
+        with f:
+            yield f
+
+    def process_challenges_to_entries(self) -> List[MixtoEntry]:
+        hold = []
+        # hints and files are small, challenges are streamed
+        hints = self.get_hints() if self.details else {}
+        files = self.get_files()
+        for challenge in self.get_challenges():
+            # hidden challenges were never shown to players, like on a live CTFd
+            if challenge.state != "visible":
+                continue
+            if challenge.category in self.config.categories:
+                entry = {"title": challenge.name, "category": challenge.category}
+            else:
+                entry = {"title": challenge.name, "category": "other"}
+            challenge_files = [f.location for f in files.get(challenge.id, [])]
+            entry["files"] = [f"{EXPORT_SCHEME}{f}" for f in challenge_files]
+            if self.details:
+                commit = challenge_commit(
+                    "",
+                    challenge.name,
+                    challenge.description or "",
+                    challenge.value or 0,
+                    challenge_files,
+                )
+                challenge_hints = hints.get(challenge.id, [])
+                if challenge_hints:
+                    commit += "\n\n## Hints\n\n" + "\n".join(
+                        f"- {h.content} ({h.cost} points)" for h in challenge_hints
+                    )
+                entry["commit"] = commit
+            hold.append(entry)
+        return hold
@@ -1,20 +1,52 @@
-from pydantic import BaseModel, validator, parse_obj_as
 import json
-from typing import List
+from typing import Iterator, List
 from pathlib import Path
 
 from lib.mixto import MixtoConfig, MixtoEntry
 
+# optional, streams json arrays without loading the whole file
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+def _read_items(path: Path) -> Iterator[dict]:
+    """
+    Yield the raw items of a json array, or of a JSON Lines file (.jsonl).
+    """
+    if path.suffix == ".jsonl":
+        with path.open() as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif ijson is not None:
+        with path.open("rb") as f:
+            yield from ijson.items(f, "item")
+    else:
+        with path.open() as f:
+            yield from json.load(f)
+
+
+def read_custom_json(config: MixtoConfig, path: str) -> Iterator[MixtoEntry]:
+    """
+    Validate and normalize the entries of a json file one at a time.
+    Categories not in the mixto config become "other".
+    """
+    for i, item in enumerate(_read_items(Path(path).resolve())):
+        try:
+            e = MixtoEntry(**item)
+        except Exception as err:
+            raise Exception(f"Invalid entry {i} in {path}: {err}")
+        category = e.category.lower()
+        entry = {
+            "title": e.title,
+            "category": category if category in config.categories else "other",
+        }
+        if e.commit:
+            entry["commit"] = e.commit
+        yield entry
+
 
 def validate_custom_json(config: MixtoConfig, path: str) -> List[MixtoEntry]:
-    with Path(path).resolve().open() as f:
-        data = json.loads(f.read())
-
-    es = parse_obj_as(List[MixtoEntry], data)
-    entries: List[MixtoEntry] = []
-    for e in es:
-        if e.category.lower() in config.categories:
-            entries.append({'title': e.title, 'category': e.category.lower()})
-        else:
-            entries.append(MixtoEntry(title=e.title, category="other").dict())
-    return entries
+    return list(read_custom_json(config, path))
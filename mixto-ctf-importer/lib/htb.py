@@ -3,7 +3,6 @@ from urllib.parse import urljoin
 from pydantic import BaseModel
 from .mixto import MixtoConfig, MixtoEntry
 from .r_types import default_headers, GetAndProcessChallenges, validate_dict
-import requests
 
 
 HTBCategories = {
@@ -40,17 +39,19 @@ class HTBResponse(BaseModel):
 
 
 class HtbCTF(GetAndProcessChallenges):
+    default_host = "https://ctf-api.hackthebox.com"
     host: str = ""
     config: MixtoConfig = None
 
-    def __init__(self, host: str, config: MixtoConfig) -> None:
+    def __init__(self, host: str, config: MixtoConfig, auth: dict = None) -> None:
         super().__init__()
         self.host = host
         self.config = config
         self.event_id = None
 
-        info = self.get_auth()
-        default_headers["Authorization"] = f"Bearer {info['token']}"
+        info = auth if auth is not None else self.get_auth()
+        self.headers = dict(default_headers)
+        self.headers["Authorization"] = f"Bearer {info['token']}"
 
         self.event_id = info["event_id"]
 
@@ -64,10 +65,7 @@ class HtbCTF(GetAndProcessChallenges):
     def get_challenges(self) -> List[HTBChallenge]:
         url = urljoin(self.host, f"/api/ctf/{self.event_id}")
         try:
-            r = requests.get(
-                url,
-                headers=default_headers,
-            )
+            r = self.get(url)
             if r.status_code >= 400:
                 print(f"\nFailed to get challenges: {r.text} {r.status_code}")
                 exit(1)
@@ -1,11 +1,21 @@
 import json
+from collections import deque
+from hashlib import sha256
+from itertools import islice
+from math import ceil
 from pathlib import Path
+from statistics import median
+from threading import Lock
+from time import perf_counter
 from urllib.parse import urljoin
-from typing import List
-import requests
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import BaseModel
+from .session import new_session
 
 MIXTO_USER_AGENT = "mixto-ctf-importer"
+# default progress file for chunked uploads
+CHECKPOINT_FILE = ".entriesAdded"
 
 
 class MixtoConfig(BaseModel):
@@ -18,12 +28,102 @@ class MixtoConfig(BaseModel):
 class MixtoEntry(BaseModel):
     title: str
     category: str
+    # optional markdown added as the first commit of the new entry
+    commit: Optional[str] = None
+    # urls of the challenge attachments
+    files: Optional[List[str]] = None
+    # markdown list of the downloaded attachments, added after commit
+    manifest: Optional[str] = None
+
+
+class UploadIncomplete(Exception):
+    """
+    Some chunks of an upload failed. added is the number of entries that
+    Mixto created from the other chunks.
+    """
+
+    def __init__(self, message: str, added: int) -> None:
+        super().__init__(message)
+        self.added = added
+
+
+def normalize_title(title: str) -> str:
+    """
+    Case and whitespace insensitive form of an entry title, used to match entries.
+    """
+    return " ".join(title.lower().split())
+
+
+def chunked(entries: Iterable[MixtoEntry], size: int) -> Iterator[List[MixtoEntry]]:
+    """
+    Split entries into lists of size, without reading ahead.
+    """
+    it = iter(entries)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class UploadCheckpoint:
+    """
+    Records which chunks of an upload succeeded, so running the same import
+    again resumes where it stopped. Progress of a different import is ignored.
+    entries is consumed once to compute the key and count.
+    """
+
+    def __init__(
+        self, path: str, workspace: str, entries: Iterable[MixtoEntry], chunk_size: int
+    ) -> None:
+        self.path = Path(path)
+        h = sha256(json.dumps([workspace, chunk_size]).encode())
+        self.count = 0
+        for e in entries:
+            h.update(json.dumps([e["title"], e["category"]]).encode())
+            self.count += 1
+        self.key = h.hexdigest()
+        self.done: Set[int] = set()
+        self.lock = Lock()
+
+    def load(self) -> Set[int]:
+        """
+        Returns the chunks already added by a previous run of this import.
+        """
+        if self.path.exists():
+            data = json.loads(self.path.read_text())
+            if data.get("key") == self.key:
+                self.done = set(data["done"])
+        return self.done
+
+    def mark_done(self, chunk: int) -> None:
+        with self.lock:
+            self.done.add(chunk)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps({"key": self.key, "done": sorted(self.done)}))
+            tmp.replace(self.path)
+
+    def clear(self) -> None:
+        if self.path.exists():
+            self.path.unlink()
 
 
 class CreateMixtoEntries:
-    def __init__(self, workspace: str = None) -> None:
-        self.config = self.read_mixto_conf()
+    def __init__(
+        self,
+        workspace: str = None,
+        pool_size: int = 10,
+        retries: int = 3,
+        config: MixtoConfig = None,
+    ) -> None:
+        # config defaults to ~/.mixto.json
+        self.config = config if config is not None else self.read_mixto_conf()
         self.workspace = workspace if workspace is not None else self.config.workspace
+        self.session = new_session(
+            {"x-api-key": self.config.api_key, "User-Agent": MIXTO_USER_AGENT},
+            pool_size,
+            retries,
+        )
 
     @property
     def mixto_url(self) -> str:
@@ -44,41 +144,211 @@ class CreateMixtoEntries:
         Returns true if the workspace has entries.
         """
         url = urljoin(self.mixto_url, f"/api/workspace/{self.workspace}")
-        res = requests.get(url, headers={"x-api-key": self.config.api_key})
+        res = self.session.get(url)
         current_count = res.json().get("entries_count", 0)
         return current_count != 0
 
-    def batch_create_entries(self, entries: List[MixtoEntry]) -> None:
+    def batch_create_entries(
+        self,
+        entries: List[MixtoEntry],
+        chunk_size: int = 50,
+        workers: int = 4,
+        checkpoint: str = CHECKPOINT_FILE,
+        confirm: bool = True,
+    ) -> int:
+        """
+        Batch create entries in chunks of chunk_size, with up to workers
+        chunks in flight. Successful chunks are recorded in the checkpoint
+        file, so re-running a failed import only sends the missing chunks.
+        Set confirm to False to skip the prompts. Returns the number of
+        entries created.
         """
-        Batch create entries
+        return self.stream_create_entries(
+            lambda: iter(entries), chunk_size, workers, checkpoint, confirm
+        )
+
+    def stream_create_entries(
+        self,
+        read: Callable[[], Iterator[MixtoEntry]],
+        chunk_size: int = 50,
+        workers: int = 4,
+        checkpoint: str = CHECKPOINT_FILE,
+        confirm: bool = True,
+    ) -> int:
         """
+        batch_create_entries for entries read from a stream. read returns a
+        new iterator over the entries and is called twice, once to count them
+        and key the checkpoint and once to upload them. At most 2 * workers
+        chunks are held in memory. Raises UploadIncomplete if a chunk failed.
+        """
+        progress = UploadCheckpoint(checkpoint, self.workspace, read(), chunk_size)
+        total = ceil(progress.count / chunk_size)
+        done = progress.load()
+        if done:
+            print(f"Resuming: {len(done)} of {total} chunks were already added")
         # check if workspace has entries
-        if self.workspace_has_entries():
+        elif confirm and self.workspace_has_entries():
             self.confirm(
                 f'The workspace "{self.workspace}" already has entries. Do you want to add to them?'
             )
 
         # confirm batch add entries
-        self.confirm(f"Do you want to add {len(entries)} entries to {self.workspace}?")
-        try:
-            url = urljoin(self.mixto_url, f"/api/entry/{self.workspace}")
-            res = requests.put(
-                url,
-                json=entries,
-                headers={
-                    "x-api-key": self.config.api_key,
-                    "User-Agent": MIXTO_USER_AGENT,
-                },
+        if confirm:
+            pending = progress.count - sum(
+                min(chunk_size, progress.count - i * chunk_size) for i in done
             )
-            if res.status_code != 200:
-                raise Exception(f"Failed to add entries: {res.status_code}")
-            # print the number of entries created
-            added = res.json()
+            self.confirm(f"Do you want to add {pending} entries to {self.workspace}?")
+
+        def send(i: int, chunk: List[MixtoEntry]):
+            start = perf_counter()
+            try:
+                added = self.upload_entries(chunk)
+            except Exception as e:
+                return i, len(chunk), perf_counter() - start, [], e
+            progress.mark_done(i)
+            return i, len(chunk), perf_counter() - start, added, None
+
+        # (chunk, size, seconds, added count, error) of every chunk sent
+        results = []
+
+        def collect(future) -> None:
+            i, size, seconds, added, error = future.result()
+            # print the entries created as each chunk completes
             for entry in added:
                 print(f"Added {entry['category']} {entry['title']}")
-            print("Entries added: ", len(added))
-        except Exception as e:
-            raise Exception(f"Error when adding entries")
+            results.append((i, size, seconds, len(added), error))
+
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for i, chunk in enumerate(chunked(read(), chunk_size)):
+                if i in done:
+                    continue
+                in_flight.append(pool.submit(send, i, chunk))
+                if len(in_flight) >= 2 * workers:
+                    collect(in_flight.popleft())
+            while in_flight:
+                collect(in_flight.popleft())
+
+        # print the latency of each chunk
+        for i, size, seconds, _, error in results:
+            status = f"failed: {error}" if error else "ok"
+            print(f"Chunk {i + 1}/{total}: {size} entries in {seconds:.2f}s {status}")
+        if results:
+            latencies = [r[2] for r in results]
+            print(
+                f"Chunk latency p50 {median(latencies):.2f}s, max {max(latencies):.2f}s"
+            )
+        added = sum(r[3] for r in results)
+        print("Entries added: ", added)
+
+        failed = [r for r in results if r[4] is not None]
+        if failed:
+            raise UploadIncomplete(
+                f"{len(failed)} of {total} chunks failed. Run the import again to resume",
+                added,
+            )
+        progress.clear()
+        return added
+
+    def existing_entries(self) -> List[dict]:
+        """
+        Returns all entries of the workspace in one request.
+        """
+        url = urljoin(self.config.host, f"/api/misc/workspaces/{self.workspace}")
+        res = self.session.get(url, params={"all": "true"})
+        if res.status_code != 200:
+            raise Exception(f"Failed to get workspace entries: {res.status_code}")
+        return [e for e in res.json() if e.get("workspace") == self.workspace]
+
+    def diff_entries(
+        self, entries: List[MixtoEntry]
+    ) -> Tuple[List[MixtoEntry], List[Tuple[MixtoEntry, str]]]:
+        """
+        Compare entries against the workspace using an index of normalized
+        titles. Returns the entries missing from the workspace, and the
+        entries whose category differs paired with the current category.
+        Duplicate titles within entries are only returned once.
+        """
+        index: Dict[str, str] = {}
+        for e in self.existing_entries():
+            index[normalize_title(e["title"])] = e.get("category", "").lower()
+
+        missing = []
+        changed = []
+        for e in entries:
+            key = normalize_title(e["title"])
+            if key not in index:
+                missing.append(e)
+                index[key] = e["category"].lower()
+            elif index[key] != e["category"].lower():
+                changed.append((e, index[key]))
+        return missing, changed
+
+    def sync_entries(
+        self,
+        entries: List[MixtoEntry],
+        chunk_size: int = 50,
+        workers: int = 4,
+        checkpoint: str = CHECKPOINT_FILE,
+    ) -> int:
+        """
+        Create only the entries missing from the workspace, without prompts,
+        and report entries whose category changed. Safe to run repeatedly.
+        Returns the number of entries created.
+        """
+        missing, changed = self.diff_entries(entries)
+        for e, current in changed:
+            print(f"Category changed for {e['title']}: {current} -> {e['category']}")
+        if len(missing) == 0:
+            print(f"{self.workspace} is up to date")
+            return 0
+        return self.batch_create_entries(missing, chunk_size, workers, checkpoint, False)
+
+    def upload_entries(self, entries: List[MixtoEntry]) -> List[dict]:
+        """
+        Add entries to the workspace without asking for confirmation.
+        Entries carrying a commit or manifest get them added as their first
+        commits. Returns the entries as created by Mixto.
+        """
+        url = urljoin(self.mixto_url, f"/api/entry/{self.workspace}")
+        res = self.session.put(
+            url,
+            json=[{"title": e["title"], "category": e["category"]} for e in entries],
+        )
+        if res.status_code != 200:
+            raise Exception(f"Failed to add entries: {res.status_code}")
+        added = res.json()
+        commits = {}
+        for e in entries:
+            c = [("Challenge details", e.get("commit")), ("Attachments", e.get("manifest"))]
+            if any(data for _, data in c):
+                commits[e["title"]] = [(title, data) for title, data in c if data]
+        if commits:
+            self.add_first_commits(added, commits)
+        return added
+
+    def add_first_commits(
+        self, added: List[dict], commits: dict, workers: int = 8
+    ) -> None:
+        """
+        Add commits to newly created entries, with entries in parallel and
+        the commits of one entry in order. commits maps an entry title to a
+        list of (commit title, data).
+        """
+        def add(entry: dict) -> None:
+            url = urljoin(
+                self.config.host,
+                f"/api/entry/{self.workspace}/{entry['entry_id']}/commit",
+            )
+            for title, data in commits[entry["title"]]:
+                res = self.session.post(
+                    url, json={"data": data, "type": "dump", "title": title}
+                )
+                if res.status_code >= 400:
+                    print(f"Failed to add {title} to {entry['title']}: {res.status_code}")
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(add, [e for e in added if e["title"] in commits]))
 
     def confirm(self, msg: str):
         """
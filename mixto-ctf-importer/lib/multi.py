@@ -0,0 +1,176 @@
+"""
+Import several CTF events in one run. Challenges are fetched from every
+target concurrently, then workspaces are uploaded in parallel, with the
+targets of one workspace uploaded one after the other.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, parse_obj_as
+
+from .mixto import (
+    CHECKPOINT_FILE,
+    CreateMixtoEntries,
+    MixtoConfig,
+    MixtoEntry,
+    UploadIncomplete,
+)
+from .registry import load_platform
+from .r_types import GetAndProcessChallenges
+
+
+class ImportTarget(BaseModel):
+    platform: str
+    host: Optional[str] = None
+    auth: Optional[Dict[str, str]] = None
+    workspace: Optional[str] = None
+    details: bool = False
+
+
+class TargetReport(BaseModel):
+    target: ImportTarget
+    workspace: str
+    fetched: int = 0
+    added: int = 0
+    fetch_seconds: float = 0
+    upload_seconds: float = 0
+    error: Optional[str] = None
+
+
+def load_targets(path: str, asynchronous: bool = False) -> List[ImportTarget]:
+    """
+    Read a json list of targets. Each target has a platform, and optionally
+    a host, auth values and a workspace. Missing auth values are prompted for.
+    Hosts default to the platform's default_host, looked up among the async
+    platforms if asynchronous is set.
+    """
+    with Path(path).resolve().open() as f:
+        targets = parse_obj_as(List[ImportTarget], json.load(f))
+    for t in targets:
+        if t.host is None:
+            t.host = load_platform(t.platform, asynchronous).default_host
+        if t.host is None:
+            raise Exception(f"A host is required for {t.platform} targets")
+    return targets
+
+
+def _fetch(
+    platform: GetAndProcessChallenges, report: TargetReport
+) -> List[MixtoEntry]:
+    start = perf_counter()
+    try:
+        entries = platform.process_challenges_to_entries()
+        report.fetched = len(entries)
+        return entries
+    # the platforms exit on bad responses, which should only fail this target
+    except (Exception, SystemExit) as e:
+        report.error = f"fetch: {e}"
+        return []
+    finally:
+        report.fetch_seconds = perf_counter() - start
+
+
+def _upload(
+    mixto: CreateMixtoEntries,
+    batch: List[Tuple[TargetReport, List[MixtoEntry], str]],
+    chunk_size: int,
+    workers: int,
+    sync: bool,
+) -> None:
+    # one target at a time, so a failure only loses the chunks of that target
+    for report, entries, checkpoint in batch:
+        start = perf_counter()
+        try:
+            if sync:
+                report.added = mixto.sync_entries(
+                    entries, chunk_size, workers, checkpoint
+                )
+            else:
+                report.added = mixto.batch_create_entries(
+                    entries, chunk_size, workers, checkpoint, False
+                )
+        except UploadIncomplete as e:
+            report.added = e.added
+            report.error = f"upload: {e}"
+        except Exception as e:
+            report.error = f"upload: {e}"
+        finally:
+            report.upload_seconds = perf_counter() - start
+
+
+def fetch_targets(
+    targets: List[ImportTarget],
+    config: MixtoConfig,
+    workers: int = 4,
+    pool_size: int = 10,
+    retries: int = 3,
+) -> List[Tuple[TargetReport, List[MixtoEntry]]]:
+    """
+    Fetch and process challenges for all targets concurrently. Platforms are
+    created one after the other first so missing credentials can be prompted for.
+    """
+    platforms = []
+    for t in targets:
+        platform = load_platform(t.platform)(t.host, config, t.auth)
+        platform.details = t.details
+        platform.workers = workers
+        platform.pool_size = pool_size
+        platform.retries = retries
+        platforms.append(platform)
+    reports = [
+        TargetReport(target=t, workspace=t.workspace or config.workspace)
+        for t in targets
+    ]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        entries = list(pool.map(_fetch, platforms, reports))
+    return list(zip(reports, entries))
+
+
+def upload_targets(
+    fetched: List[Tuple[TargetReport, List[MixtoEntry]]],
+    workers: int = 4,
+    pool_size: int = 10,
+    retries: int = 3,
+    chunk_size: int = 50,
+    checkpoint: str = CHECKPOINT_FILE,
+    sync: bool = False,
+) -> None:
+    """
+    Upload fetched entries in chunks of chunk_size, with workspaces in
+    parallel and the targets of a workspace one after the other. Each target
+    is checkpointed in its own file, checkpoint followed by the target's
+    position in the list. With sync only the entries missing from the
+    workspace are created. report.added is the number of entries Mixto created.
+    """
+    by_workspace: Dict[str, List[Tuple[TargetReport, List[MixtoEntry], str]]] = {}
+    for i, (report, entries) in enumerate(fetched):
+        if report.error is None and len(entries) > 0:
+            by_workspace.setdefault(report.workspace, []).append(
+                (report, entries, f"{checkpoint}.{i}")
+            )
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for workspace, batch in by_workspace.items():
+            mixto = CreateMixtoEntries(workspace, pool_size, retries)
+            pool.submit(_upload, mixto, batch, chunk_size, workers, sync)
+
+
+def print_report(reports: List[TargetReport]) -> None:
+    """
+    Print one line per target and the totals.
+    """
+    for r in reports:
+        t = r.target
+        print(
+            f"{t.platform:<5} {t.host} -> {r.workspace}: "
+            f"fetched {r.fetched} ({r.fetch_seconds:.2f}s), "
+            f"added {r.added} ({r.upload_seconds:.2f}s)"
+            + (f" ERROR {r.error}" if r.error else "")
+        )
+    print(
+        f"Targets: {len(reports)}, "
+        f"failed: {len([r for r in reports if r.error])}, "
+        f"entries added: {sum(r.added for r in reports)}"
+    )
@@ -1,9 +1,8 @@
-from typing import List
+from typing import Iterator, List
 from urllib.parse import urljoin
 from pydantic import BaseModel
 from .mixto import MixtoConfig, MixtoEntry
-from .r_types import default_headers, GetAndProcessChallenges, validate_dict
-import requests
+from .r_types import default_headers, GetAndProcessChallenges, paginate, validate_dict
 
 
 class PicoCallengeCategory(BaseModel):
@@ -15,29 +14,27 @@ class PicoChallenge(BaseModel):
     category: PicoCallengeCategory
 
 
-class PicoResponse(BaseModel):
-    results: List[PicoChallenge]
-
-
 class PicoCTF(GetAndProcessChallenges):
+    default_host = "https://play.picoctf.org"
     host: str = ""
     config: MixtoConfig = None
 
-    def __init__(self, host: str, config: MixtoConfig) -> None:
+    def __init__(self, host: str, config: MixtoConfig, auth: dict = None) -> None:
         super().__init__()
         self.host = host
         self.cookies = None
         self.config = config
         self.event_id = None
 
-        get_cookies = self.get_auth()
+        get_cookies = auth if auth is not None else self.get_auth()
         cookies = {
             "csrftoken": get_cookies["csrftoken"],
             "sessionid": get_cookies["sessionid"],
         }
         # convert cookie to a string to pass in headers
         cookies_to_header = "; ".join([f"{k}={v}" for k, v in cookies.items()])
-        default_headers["cookie"] = cookies_to_header
+        self.headers = dict(default_headers)
+        self.headers["cookie"] = cookies_to_header
 
         self.event_id = get_cookies["original_event"]
 
@@ -49,21 +46,26 @@ class PicoCTF(GetAndProcessChallenges):
         validate_dict(c)
         return c
 
-    def get_challenges(self) -> List[PicoChallenge]:
-        url = urljoin(self.host, "/api/challenges/")
+    def get_page(self, url: str, params: dict) -> dict:
         try:
-            r = requests.get(
-                url,
-                headers=default_headers,
-                params={"original_event": self.event_id, "page_size": 100},
-            )
+            r = self.get(url, params=params)
             if r.status_code >= 400:
                 print(f"\nFailed to get challenges: {r.text} {r.status_code}")
                 exit(1)
-            return PicoResponse(**r.json()).results
+            return r.json()
         except Exception as e:
             raise Exception(f"Failed to get challenges: {e}")
 
+    def get_challenges(self) -> Iterator[PicoChallenge]:
+        url = urljoin(self.host, "/api/challenges/")
+        for c in paginate(
+            self.get_page,
+            url,
+            {"original_event": self.event_id},
+            workers=self.workers,
+        ):
+            yield PicoChallenge(**c)
+
     def process_challenges_to_entries(self) -> List[MixtoEntry]:
         hold = []
         challenges = self.get_challenges()
@@ -1,6 +1,14 @@
-from typing import Any, List
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
 from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from math import ceil
+from urllib.parse import urljoin
+import requests
 from .mixto import MixtoEntry
+from .session import new_session
 
 USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/97.0.4692.99 Safari/537.36"
 
@@ -10,9 +18,78 @@ default_headers = {"User-Agent": USER_AGENT}
 class GetAndProcessChallenges(ABC):
     """
     Abstract class for getting and processing challenges.
-    Should be used to implement various ctf platforms.
+    Should be used to implement various ctf platforms. Implementations take
+    an optional auth dict and only prompt with get_auth when it is not given.
+    Requests should go through self.session, which carries self.headers.
     """
 
+    headers: dict = default_headers
+    # host used when none is given, for platforms with a single public instance
+    default_host: Optional[str] = None
+    # connection pool size and retries of the per-instance session
+    pool_size: int = 10
+    retries: int = 3
+    _session: Optional[requests.Session] = None
+
+    # attach challenge details as the first commit of each entry, where supported
+    details: bool = False
+    # max concurrent requests while fetching challenge details
+    workers: int = 8
+
+    # send the validators of the previous response with every GET, see get
+    conditional: bool = False
+    # url -> (validator headers, last 200 response)
+    _validators: Optional[Dict[str, Tuple[dict, requests.Response]]] = None
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        Pooled session owned by this platform instance, created on first use.
+        """
+        if self._session is None:
+            self._session = new_session(
+                self.headers, max(self.pool_size, self.workers), self.retries
+            )
+        return self._session
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        GET url through self.session. When conditional is set, the ETag and
+        Last-Modified of the last 200 response for the same url are sent as
+        If-None-Match and If-Modified-Since, and a 304 returns that response again.
+        """
+        if not self.conditional:
+            return self.session.get(url, **kwargs)
+        if self._validators is None:
+            self._validators = {}
+        key = requests.Request("GET", url, params=kwargs.get("params")).prepare().url
+        cached = self._validators.get(key)
+        headers = dict(kwargs.pop("headers", None) or {})
+        if cached is not None:
+            headers.update(cached[0])
+        r = self.session.get(url, headers=headers, **kwargs)
+        if r.status_code == 304 and cached is not None:
+            return cached[1]
+        if r.status_code == 200:
+            validators = {}
+            if "ETag" in r.headers:
+                validators["If-None-Match"] = r.headers["ETag"]
+            if "Last-Modified" in r.headers:
+                validators["If-Modified-Since"] = r.headers["Last-Modified"]
+            if validators:
+                self._validators[key] = (validators, r)
+        return r
+
+    @contextmanager
+    def open_attachment(self, url: str) -> Iterator[BinaryIO]:
+        """
+        Open an attachment listed in an entry's files for streaming reads.
+        """
+        with self.session.get(url, stream=True) as r:
+            r.raise_for_status()
+            r.raw.decode_content = True
+            yield r.raw
+
     @abstractmethod
     def get_auth(self) -> dict:
         """
@@ -40,3 +117,71 @@ def validate_dict(d: dict) -> None:
     for k, v in d.items():
         if not v:
             raise Exception(f"{k} is not provided")
+
+
+def challenge_commit(
+    host: str, name: str, description: str, points: int, files: List[str]
+) -> str:
+    """Format challenge details as the markdown body of an entry's first commit."""
+    parts = [f"# {name}", f"**Points:** {points}", description.strip()]
+    if files:
+        parts.append("## Files")
+        parts.append("\n".join(f"- {urljoin(host, f)}" for f in files))
+    return "\n\n".join(p for p in parts if p)
+
+
+def paginate(
+    get_page: Callable[[str, dict], dict],
+    url: str,
+    params: dict,
+    page_size: int = 100,
+    workers: int = 4,
+    results_key: str = "results",
+) -> Iterator[Any]:
+    """Stream the results of a paged API one item at a time.
+
+    The first page is fetched on its own. If it reports a total count, the
+    remaining pages are requested concurrently by page number, no more than
+    workers at a time, and yielded in order. The number of pages is worked
+    out from the size of the first page, as servers may cap page_size.
+    Otherwise the next links are followed one after the other.
+
+    Args:
+        get_page (Callable[[str, dict], dict]): Requests a url with query params
+            and returns the decoded json page
+        url (str): url of the paged endpoint
+        params (dict): query params sent with every page
+        page_size (int, optional): Items per page. Defaults to 100.
+        workers (int, optional): Max pages in flight. Defaults to 4.
+        results_key (str, optional): Key holding a page's items. Defaults to "results".
+
+    Yields:
+        Any: Items in the order the API returns them
+    """
+    params = {**params, "page_size": page_size}
+    page = get_page(url, {**params, "page": 1})
+    yield from page[results_key]
+
+    count = page.get("count")
+    served = len(page[results_key])
+    if count is not None and served:
+        pages = iter(range(2, ceil(count / served) + 1))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque(
+                pool.submit(get_page, url, {**params, "page": n})
+                for n in islice(pages, workers)
+            )
+            while pending:
+                p = pending.popleft().result()
+                n = next(pages, None)
+                if n is not None:
+                    pending.append(pool.submit(get_page, url, {**params, "page": n}))
+                yield from p[results_key]
+        return
+
+    next_url = page.get("next")
+    while next_url:
+        # next links already carry the query params
+        page = get_page(next_url, {})
+        yield from page[results_key]
+        next_url = page.get("next")
@@ -2,13 +2,25 @@ from typing import List
 from urllib.parse import urljoin
 from pydantic import BaseModel
 from .mixto import MixtoConfig, MixtoEntry
-from .r_types import default_headers, GetAndProcessChallenges, validate_dict
-import requests
+from .r_types import (
+    default_headers,
+    GetAndProcessChallenges,
+    challenge_commit,
+    validate_dict,
+)
+
+
+class RctfFile(BaseModel):
+    name: str
+    url: str
 
 
 class RctfChallenge(BaseModel):
     name: str
     category: str
+    description: str = ""
+    points: int = 0
+    files: List[RctfFile] = []
 
 
 class RctfResponse(BaseModel):
@@ -19,13 +31,14 @@ class RCTF(GetAndProcessChallenges):
     host: str = ""
     config: MixtoConfig = None
 
-    def __init__(self, host: str, config: MixtoConfig) -> None:
+    def __init__(self, host: str, config: MixtoConfig, auth: dict = None) -> None:
         super().__init__()
         self.host = host
         self.config = config
 
-        info = self.get_auth()
-        default_headers["Authorization"] = f"Bearer {info['token']}"
+        info = auth if auth is not None else self.get_auth()
+        self.headers = dict(default_headers)
+        self.headers["Authorization"] = f"Bearer {info['token']}"
 
     def get_auth(self) -> dict:
         c = {}
@@ -36,10 +49,7 @@ class RCTF(GetAndProcessChallenges):
     def get_challenges(self) -> List[RctfChallenge]:
         url = urljoin(self.host, f"/api/v1/challs")
         try:
-            r = requests.get(
-                url,
-                headers=default_headers,
-            )
+            r = self.get(url)
             if r.status_code >= 400:
                 print(f"\nFailed to get challenges: {r.text} {r.status_code}")
                 exit(1)
@@ -49,10 +59,22 @@ class RCTF(GetAndProcessChallenges):
 
     def process_challenges_to_entries(self) -> List[MixtoEntry]:
         hold = []
+        # /api/v1/challs already carries the full challenge details,
+        # so unlike CTFd no extra requests are needed
         challenges = self.get_challenges()
         for challenge in challenges:
             if challenge.category in self.config.categories:
-                hold.append({"title": challenge.name, "category": challenge.category})
+                entry = {"title": challenge.name, "category": challenge.category}
             else:
-                hold.append({"title": challenge.name, "category": "other"})
+                entry = {"title": challenge.name, "category": "other"}
+            entry["files"] = [urljoin(self.host, f.url) for f in challenge.files]
+            if self.details:
+                entry["commit"] = challenge_commit(
+                    self.host,
+                    challenge.name,
+                    challenge.description,
+                    challenge.points,
+                    [f.url for f in challenge.files],
+                )
+            hold.append(entry)
         return hold
@@ -0,0 +1,73 @@
+"""
+Registry of ctf platforms by name. A platform module is only imported once
+its platform is selected. Third-party packages can add platforms with an
+entry point in the "mixto_ctf_importer.platforms" group that names a
+GetAndProcessChallenges subclass, for example in pyproject.toml:
+
+    [project.entry-points."mixto_ctf_importer.platforms"]
+    myctf = "myctf_mixto:MyCTF"
+
+Async platforms (AsyncGetAndProcessChallenges) are registered the same way
+in the "mixto_ctf_importer.async_platforms" group.
+"""
+from importlib import import_module
+from typing import Dict, List
+
+ENTRY_POINT_GROUP = "mixto_ctf_importer.platforms"
+ASYNC_ENTRY_POINT_GROUP = "mixto_ctf_importer.async_platforms"
+
+# platform name -> "module:class", relative to this package
+PLATFORMS: Dict[str, str] = {
+    "ctfd": ".ctfd:CTFd",
+    "ctfd-export": ".ctfd_export:CTFdExport",
+    "htb": ".htb:HtbCTF",
+    "pico": ".pico:PicoCTF",
+    "rctf": ".rctf:RCTF",
+}
+
+ASYNC_PLATFORMS: Dict[str, str] = {
+    "ctfd": ".aio_platforms:AsyncCTFd",
+    "htb": ".aio_platforms:AsyncHtbCTF",
+    "pico": ".aio_platforms:AsyncPicoCTF",
+    "rctf": ".aio_platforms:AsyncRCTF",
+}
+
+
+def _entry_points(group: str = ENTRY_POINT_GROUP) -> list:
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return []
+    eps = entry_points()
+    # python < 3.10 returns a dict of groups
+    if hasattr(eps, "select"):
+        return list(eps.select(group=group))
+    return list(eps.get(group, []))
+
+
+def platform_names(asynchronous: bool = False) -> List[str]:
+    """
+    Names of the built-in and installed platforms.
+    """
+    builtin = ASYNC_PLATFORMS if asynchronous else PLATFORMS
+    group = ASYNC_ENTRY_POINT_GROUP if asynchronous else ENTRY_POINT_GROUP
+    return sorted(set(builtin) | {ep.name for ep in _entry_points(group)})
+
+
+def load_platform(name: str, asynchronous: bool = False) -> type:
+    """
+    Import and return the GetAndProcessChallenges class registered as name,
+    or the AsyncGetAndProcessChallenges class if asynchronous is set.
+    Built-in platforms take precedence over entry points.
+    """
+    builtin = ASYNC_PLATFORMS if asynchronous else PLATFORMS
+    group = ASYNC_ENTRY_POINT_GROUP if asynchronous else ENTRY_POINT_GROUP
+    if name in builtin:
+        module, cls = builtin[name].split(":")
+        return getattr(import_module(module, __package__), cls)
+    for ep in _entry_points(group):
+        if ep.name == name:
+            return ep.load()
+    raise Exception(
+        f"Unknown platform {name}. Available: {', '.join(platform_names(asynchronous))}"
+    )
@@ -0,0 +1,38 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# statuses worth retrying. Anything else is returned to the caller as is
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def new_session(
+    headers: dict = None, pool_size: int = 10, retries: int = 3
+) -> requests.Session:
+    """Create a requests session with its own connection pool.
+
+    Only GET and HEAD are retried, with exponential backoff, so batch
+    PUTs and commit POSTs are never sent twice.
+
+    Args:
+        headers (dict, optional): Headers sent with every request. Defaults to None.
+        pool_size (int, optional): Connections kept per host. Defaults to 10.
+        retries (int, optional): Retries on connection errors and 429/5xx. Defaults to 3.
+
+    Returns:
+        requests.Session: The session
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
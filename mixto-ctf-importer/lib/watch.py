@@ -0,0 +1,67 @@
+"""
+Poll a platform and push newly released challenges to Mixto.
+"""
+import random
+from time import sleep, strftime
+from typing import Set
+
+from .mixto import CHECKPOINT_FILE, CreateMixtoEntries, normalize_title
+from .r_types import GetAndProcessChallenges
+
+
+def next_delay(
+    interval: float, failures: int, max_interval: float, jitter: float
+) -> float:
+    """
+    Seconds until the next poll. The interval doubles with every consecutive
+    failure up to max_interval, and is spread by +/- jitter so several
+    watchers do not poll in lockstep.
+    """
+    delay = min(interval * 2 ** failures, max_interval)
+    return delay * random.uniform(1 - jitter, 1 + jitter)
+
+
+def watch(
+    platform: GetAndProcessChallenges,
+    mixto: CreateMixtoEntries,
+    interval: float = 60,
+    max_interval: float = 900,
+    jitter: float = 0.2,
+    chunk_size: int = 50,
+    workers: int = 4,
+    checkpoint: str = CHECKPOINT_FILE,
+) -> None:
+    """Poll platform until interrupted and add new challenges to the workspace.
+
+    List requests are conditional, so polls of an unchanged scoreboard are
+    answered with a 304 where the platform supports it. Challenges are diffed
+    against the titles seen by earlier polls and only new ones are synced.
+    Challenges that fail to upload are retried on the next poll.
+
+    Args:
+        platform (GetAndProcessChallenges): The platform to poll
+        mixto (CreateMixtoEntries): Uploader for the target workspace
+        interval (float, optional): Seconds between polls. Defaults to 60.
+        max_interval (float, optional): Upper bound of the backoff. Defaults to 900.
+        jitter (float, optional): Relative spread of each delay. Defaults to 0.2.
+        chunk_size (int, optional): Entries per upload request. Defaults to 50.
+        workers (int, optional): Chunks in flight. Defaults to 4.
+        checkpoint (str, optional): Progress file of the chunked upload.
+    """
+    platform.conditional = True
+    seen: Set[str] = set()
+    failures = 0
+    while True:
+        try:
+            entries = platform.process_challenges_to_entries()
+            new = [e for e in entries if normalize_title(e["title"]) not in seen]
+            if new:
+                print(f"[{strftime('%H:%M:%S')}] {len(new)} new challenges")
+                mixto.sync_entries(new, chunk_size, workers, checkpoint)
+                seen.update(normalize_title(e["title"]) for e in new)
+            failures = 0
+        # the platforms exit on bad responses, which should only fail this poll
+        except (Exception, SystemExit) as e:
+            failures += 1
+            print(f"[{strftime('%H:%M:%S')}] Poll failed ({failures} in a row): {e}")
+        sleep(next_delay(interval, failures, max_interval, jitter))
@@ -3,15 +3,9 @@ This script allows calling the CTFd API and automatically creating valid
 Mixto entries.
 """
 import argparse
-from typing import List
-from lib.ctfd import CTFd
-from lib.pico import PicoCTF
-from lib.htb import HtbCTF
+from lib.registry import PLATFORMS, load_platform
 
-from lib.r_types import MixtoEntry
-from lib.mixto import MixtoEntry, CreateMixtoEntries
-from lib.custom import validate_custom_json
-from lib.rctf import RCTF
+# everything else is imported only by the mode that needs it, to keep startup fast
 
 
 if __name__ == "__main__":
@@ -21,56 +15,274 @@ if __name__ == "__main__":
     parser.add_argument(
         "-p",
         "--platform",
-        help="The CTF scoring platform to use",
-        choices=["ctfd", "htb", "pico", "rctf"],
+        help=f"The CTF scoring platform to use: {', '.join(PLATFORMS)}, or an installed plugin",
+    )
+    parser.add_argument(
+        "--host",
+        help="Host of the platform, or the path of the zip for ctfd-export. Prompted for if needed",
     )
     parser.add_argument(
         "--workspace", help="The workspace to add entries to. Defaults to mixto config"
     )
     parser.add_argument(
         "--json",
-        help="The path to the json file containing the entries.",
+        help="The path to the json or JSON Lines (.jsonl) file containing the entries.",
         required=False,
     )
+    parser.add_argument(
+        "--targets",
+        help="The path to a json file listing several events to import at once",
+        required=False,
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of concurrent requests when fetching events and challenge details",
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        "--pool-size",
+        help="Connections kept open per host",
+        type=int,
+        default=10,
+    )
+    parser.add_argument(
+        "--retries",
+        help="Retries for failed GET requests (connection errors, 429 and 5xx)",
+        type=int,
+        default=3,
+    )
+    parser.add_argument(
+        "--chunk-size",
+        help="Entries sent per upload request",
+        type=int,
+        default=50,
+    )
+    parser.add_argument(
+        "--checkpoint",
+        help="Progress file used to resume a failed upload",
+        default=".entriesAdded",
+    )
+    parser.add_argument(
+        "--sync",
+        help="Only add challenges missing from the workspace, without prompts",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--watch",
+        help="Keep polling the platform and add new challenges as they are released",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--interval",
+        help="Seconds between polls in watch mode",
+        type=float,
+        default=60,
+    )
+    parser.add_argument(
+        "--max-interval",
+        help="Upper bound of the backoff after failed polls in watch mode",
+        type=float,
+        default=900,
+    )
+    parser.add_argument(
+        "--async",
+        help="Fetch, enrich and upload concurrently with asyncio (requires aiohttp)",
+        dest="use_async",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--queue-size",
+        help="Challenges and entries buffered between the stages of --async",
+        type=int,
+        default=100,
+    )
+    parser.add_argument(
+        "--attachments",
+        help="Download challenge files into this directory and commit a manifest to each entry (ctfd, ctfd-export, rctf)",
+        metavar="DIR",
+    )
+    parser.add_argument(
+        "--details",
+        help="Add challenge descriptions, points and files as the first commit of each entry (ctfd, rctf)",
+        action="store_true",
+        default=False,
+    )
     args = parser.parse_args()
 
-    # placeholder for mixto entries
-    entries: List[MixtoEntry] = []
+    if args.use_async:
+        # the asyncio pipeline uploads while fetching, without these stages
+        unsupported = [
+            flag
+            for flag, given in (
+                ("--attachments", args.attachments is not None),
+                ("--sync", args.sync),
+                ("--checkpoint", args.checkpoint != parser.get_default("checkpoint")),
+                ("--watch", args.watch),
+            )
+            if given
+        ]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} cannot be used with --async")
+
+    if args.targets:
+        # targets are fetched and uploaded once, without attachment downloads
+        unsupported = [
+            flag
+            for flag, given in (
+                ("--attachments", args.attachments is not None),
+                ("--watch", args.watch),
+            )
+            if given
+        ]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} cannot be used with --targets")
+
+    from lib.mixto import CreateMixtoEntries
+
     mixto = CreateMixtoEntries(
         workspace=args.workspace,
+        pool_size=args.pool_size,
+        retries=args.retries,
     )
 
     if args.json:
-        entries = validate_custom_json(mixto.config, args.json)
-        mixto.batch_create_entries(entries)
-        exit(0)
+        from lib.custom import read_custom_json, validate_custom_json
 
-    ctf_platform = args.platform
-    if ctf_platform == "ctfd":
-        ctfdHost = input("CTFD host: ")
-        c = CTFd(ctfdHost, mixto.config)
-        entries = c.process_challenges_to_entries()
+        if args.sync:
+            entries = validate_custom_json(mixto.config, args.json)
+            mixto.sync_entries(entries, args.chunk_size, args.workers, args.checkpoint)
+        else:
+            # stream the file so large imports are never held in memory
+            mixto.stream_create_entries(
+                lambda: read_custom_json(mixto.config, args.json),
+                args.chunk_size,
+                args.workers,
+                args.checkpoint,
+            )
+        exit(0)
 
-    elif ctf_platform == "rctf":
-        c = RCTF(input("Host: "), mixto.config)
-        entries = c.process_challenges_to_entries()
+    if args.targets:
+        from lib.multi import load_targets, fetch_targets, upload_targets, print_report
 
-    elif ctf_platform == "pico":
-        c = PicoCTF("https://play.picoctf.org", mixto.config)
-        entries = c.process_challenges_to_entries()
+        targets = load_targets(args.targets, args.use_async)
+        if args.details:
+            for t in targets:
+                t.details = True
+        if args.use_async:
+            from lib.aio import run_targets
 
-    elif ctf_platform == "htb":
-        c = HtbCTF("https://ctf-api.hackthebox.com", mixto.config)
-        entries = c.process_challenges_to_entries()
+            # entries are uploaded while they are fetched, so confirm up front
+            mixto.confirm(
+                f"Do you want to add the challenges of {len(targets)} targets to Mixto?"
+            )
+            reports = run_targets(
+                targets,
+                mixto.config,
+                args.workers,
+                args.pool_size,
+                args.retries,
+                args.chunk_size,
+                args.queue_size,
+            )
+            print_report(reports)
+            exit(0)
+        fetched = fetch_targets(
+            targets, mixto.config, args.workers, args.pool_size, args.retries
+        )
+        total = sum(len(e) for r, e in fetched if r.error is None)
+        workspaces = {r.workspace for r, e in fetched if r.error is None and e}
+        if total > 0:
+            if not args.sync:
+                mixto.confirm(
+                    f"Do you want to add {total} entries to {len(workspaces)} workspaces?"
+                )
+            upload_targets(
+                fetched,
+                args.workers,
+                args.pool_size,
+                args.retries,
+                args.chunk_size,
+                args.checkpoint,
+                args.sync,
+            )
+        print_report([r for r, _ in fetched])
+        exit(0)
 
-    else:
+    if not args.platform:
         print("Scoring server not implemented yet. Use --json to specify a json file.")
         exit(1)
+    try:
+        platform = load_platform(args.platform, args.use_async)
+    except Exception as e:
+        print(e)
+        exit(1)
+    host = args.host or platform.default_host or input("Host: ")
+
+    if args.use_async:
+        from lib.aio import run_targets
+        from lib.multi import ImportTarget, print_report
+
+        target = ImportTarget(
+            platform=args.platform,
+            host=host,
+            workspace=mixto.workspace,
+            details=args.details,
+        )
+        mixto.confirm(f"Do you want to add the challenges to {mixto.workspace}?")
+        reports = run_targets(
+            [target],
+            mixto.config,
+            args.workers,
+            args.pool_size,
+            args.retries,
+            args.chunk_size,
+            args.queue_size,
+        )
+        print_report(reports)
+        exit(0)
+
+    c = platform(host, mixto.config)
+
+    # ctfd only lists files in the challenge details
+    c.details = args.details or args.attachments is not None
+    c.workers = args.workers
+    c.pool_size = args.pool_size
+    c.retries = args.retries
+
+    if args.watch:
+        from lib.watch import watch
+
+        try:
+            watch(
+                c,
+                mixto,
+                args.interval,
+                args.max_interval,
+                chunk_size=args.chunk_size,
+                workers=args.workers,
+                checkpoint=args.checkpoint,
+            )
+        except KeyboardInterrupt:
+            print("Stopped watching")
+        exit(0)
+
+    entries = c.process_challenges_to_entries()
 
     # sanity check
     if len(entries) == 0:
         print("No challenges found")
         exit(1)
 
+    if args.attachments:
+        from lib.attachments import AttachmentStore
+
+        store = AttachmentStore(args.attachments, c.open_attachment, args.workers)
+        store.download_entries(entries)
+
     # batch create entries
-    mixto.batch_create_entries(entries)
+    upload = mixto.sync_entries if args.sync else mixto.batch_create_entries
+    upload(entries, args.chunk_size, args.workers, args.checkpoint)
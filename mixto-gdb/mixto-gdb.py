@@ -1,8 +1,13 @@
 import gdb
 from os import getenv
-from urllib.request import urlopen, Request
-from urllib.parse import urljoin
-from urllib.error import HTTPError
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.parse import unquote, urljoin, urlparse
+from urllib.request import getproxies, proxy_bypass
+from base64 import b64encode
+from threading import Lock, Thread
+from time import monotonic
+import io
+import socket
 from pathlib import Path
 from json import loads, dumps
 
@@ -10,6 +15,20 @@ MIXTO_ENTRY_ID = getenv("MIXTO_ENTRY_ID")
 MIXTO_HOST = getenv("MIXTO_HOST")
 MIXTO_API_KEY = getenv("MIXTO_API_KEY")
 MIXTO_WORKSPACE = getenv("MIXTO_WORKSPACE")
+# set MIXTO_PREWARM=0 to skip warming up the connection when gdb loads the script
+MIXTO_PREWARM = getenv("MIXTO_PREWARM", "1") != "0"
+# timeouts in seconds. MIXTO_CALL_TIMEOUT bounds a whole command, reconnects included
+MIXTO_CONNECT_TIMEOUT = float(getenv("MIXTO_CONNECT_TIMEOUT", 5))
+MIXTO_READ_TIMEOUT = float(getenv("MIXTO_READ_TIMEOUT", 30))
+MIXTO_CALL_TIMEOUT = float(getenv("MIXTO_CALL_TIMEOUT", 60))
+
+# statuses whose Location is followed, like urlopen does
+REDIRECTS = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+
+# single keep-alive connection reused across mixto commands
+_conn = None
+_conn_lock = Lock()
 
 class MissingRequired(Exception):
     pass
@@ -19,7 +38,148 @@ class BadResponse(Exception):
     pass
 
 
-def _send_to_mixto(out: str, arg: str):
+class RequestTimeout(Exception):
+    pass
+
+
+class _DeadlineSocket:
+    """Pooled socket that caps every recv by what is left of the deadline"""
+
+    def __init__(self, sock: socket.socket):
+        self._sock = sock
+        self.next_timeout = None
+
+    def recv_into(self, *args) -> int:
+        if self.next_timeout is not None:
+            self._sock.settimeout(self.next_timeout())
+        return self._sock.recv_into(*args)
+
+    def makefile(self, mode: str = "rb") -> io.BufferedReader:
+        # http.client reads the response through this, so its recvs come back here
+        return io.BufferedReader(socket.SocketIO(self, "rb"))
+
+    def __getattr__(self, name: str):
+        return getattr(self._sock, name)
+
+
+def _proxy(url: str):
+    """Proxy address and auth headers for url from HTTP(S)_PROXY, None if
+    there is no proxy for its scheme or NO_PROXY excludes its host"""
+    u = urlparse(url)
+    proxy = getproxies().get(u.scheme)
+    if not proxy or proxy_bypass(u.hostname or ""):
+        return None
+    p = urlparse(proxy if "//" in proxy else "http://" + proxy)
+    headers = {}
+    if p.username:
+        creds = f"{unquote(p.username)}:{unquote(p.password or '')}"
+        headers["Proxy-Authorization"] = "Basic " + b64encode(creds.encode()).decode()
+    return p.netloc.rpartition("@")[2], headers
+
+
+def _new_connection(url: str = None):
+    """New, not yet connected connection to the origin of url, the Mixto host
+    by default. https is tunnelled through the proxy with CONNECT"""
+    u = urlparse(url or MIXTO_HOST)
+    cls = HTTPSConnection if u.scheme == "https" else HTTPConnection
+    proxy = _proxy(u.geturl())
+    if proxy is None:
+        return cls(u.netloc)
+    conn = cls(proxy[0])
+    if u.scheme == "https":
+        conn.set_tunnel(u.hostname, u.port, proxy[1])
+    return conn
+
+
+def _connection():
+    global _conn
+    if _conn is None:
+        _conn = _new_connection()
+    return _conn
+
+
+def _remaining(deadline: float, limit: float) -> float:
+    left = deadline - monotonic()
+    if left <= 0:
+        raise RequestTimeout("Mixto call ran past its deadline")
+    return min(left, limit)
+
+
+def _roundtrip(conn, method: str, url: str, data: bytes, headers: dict, deadline: float):
+    u = urlparse(url)
+    target = u.path + ("?" + u.query if u.query else "")
+    proxy = _proxy(url) if u.scheme == "http" else None
+    if proxy is not None:
+        # plain http goes to the proxy with the absolute url as target
+        target = url
+        headers = {**headers, **proxy[1]}
+    try:
+        if conn.sock is None:
+            conn.timeout = _remaining(deadline, MIXTO_CONNECT_TIMEOUT)
+            conn.connect()
+            conn.sock = _DeadlineSocket(conn.sock)
+        conn.sock.settimeout(_remaining(deadline, MIXTO_READ_TIMEOUT))
+        conn.sock.next_timeout = lambda: _remaining(deadline, MIXTO_READ_TIMEOUT)
+        conn.request(method, target, body=data, headers=headers)
+        res = conn.getresponse()
+        location = res.getheader("Location") if res.status in REDIRECTS else None
+        return res.status, res.read(), location
+    except socket.timeout:
+        conn.close()
+        raise RequestTimeout("Mixto did not respond in time")
+    except Exception:
+        conn.close()
+        raise
+
+
+def _request(method: str, url: str, data: bytes, headers: dict, deadline: float):
+    """One request to url. The Mixto host is reached over the pooled
+    connection, other hosts a redirect points to over a one-off one"""
+    if urlparse(url)[:2] != urlparse(MIXTO_HOST)[:2]:
+        conn = _new_connection(url)
+        try:
+            return _roundtrip(conn, method, url, data, headers, deadline)
+        finally:
+            conn.close()
+    conn = _connection()
+    try:
+        return _roundtrip(conn, method, url, data, headers, deadline)
+    except (ConnectionResetError, BrokenPipeError):
+        # the server dropped the idle keep-alive connection, reopen once
+        return _roundtrip(conn, method, url, data, headers, deadline)
+
+
+def _send(method: str, url: str, data: bytes, headers: dict, deadline: float):
+    """Send a request and return its status and body. Redirects are followed
+    the way urlopen does: GET and HEAD go to the new location, a POST answered
+    with 301, 302 or 303 becomes a bodiless GET"""
+    with _conn_lock:
+        for _ in range(MAX_REDIRECTS + 1):
+            status, body, location = _request(method, url, data, headers, deadline)
+            if location is None:
+                return status, body
+            if method not in ("GET", "HEAD"):
+                if method != "POST" or status not in (301, 302, 303):
+                    return status, body
+                method, data = "GET", None
+                headers = {k: v for k, v in headers.items() if k != "Content-Type"}
+            url = urljoin(url, location)
+    raise BadResponse(status, f"More than {MAX_REDIRECTS} redirects")
+
+
+def _prewarm():
+    """Resolve the host and open the pooled connection before the first command"""
+    try:
+        with _conn_lock:
+            conn = _connection()
+            conn.timeout = MIXTO_CONNECT_TIMEOUT
+            conn.connect()
+            conn.sock = _DeadlineSocket(conn.sock)
+    except Exception:
+        pass
+
+
+def _send_to_mixto(out: str, arg: str, timeout: float = None):
     if MIXTO_WORKSPACE is None:
         raise MissingRequired("Workspace is missing")
 
@@ -33,22 +193,15 @@ def _send_to_mixto(out: str, arg: str):
         raise MissingRequired("Mixto API key is missing")
 
     url = urljoin(MIXTO_HOST, "/api/entry/" + MIXTO_WORKSPACE + "/" + MIXTO_ENTRY_ID + "/commit")
-    req = Request(
-        method="POST",
-        url=url,
-        data=dumps(
-            {"type": "tool", "title": "(GDB) - " + arg, "data": out, "meta": {}, "tags": ["gdb"]}
-        ).encode(),
-        headers={"x-api-key": MIXTO_API_KEY, "Content-Type": "application/json"},
-    )
-    try:
-        res = urlopen(req)
-        status = res.getcode()
-        if status > 300:
-            raise BadResponse(status, res)
-        print("Sent!")
-    except HTTPError as e:
-        raise
+    data = dumps(
+        {"type": "tool", "title": "(GDB) - " + arg, "data": out, "meta": {}, "tags": ["gdb"]}
+    ).encode()
+    headers = {"x-api-key": MIXTO_API_KEY, "Content-Type": "application/json"}
+    deadline = monotonic() + (MIXTO_CALL_TIMEOUT if timeout is None else timeout)
+    status, body = _send("POST", url, data, headers, deadline)
+    if status > 300:
+        raise BadResponse(status, body)
+    print("Sent!")
 
 
 try:
@@ -59,11 +212,21 @@ try:
                 j = loads(f.read())
                 MIXTO_HOST = j.get("host")
                 MIXTO_API_KEY = j.get("api_key")
+                # optional timeouts, envars still take precedence
+                if getenv("MIXTO_CONNECT_TIMEOUT") is None:
+                    MIXTO_CONNECT_TIMEOUT = float(j.get("connect_timeout", MIXTO_CONNECT_TIMEOUT))
+                if getenv("MIXTO_READ_TIMEOUT") is None:
+                    MIXTO_READ_TIMEOUT = float(j.get("read_timeout", MIXTO_READ_TIMEOUT))
+                if getenv("MIXTO_CALL_TIMEOUT") is None:
+                    MIXTO_CALL_TIMEOUT = float(j.get("call_timeout", MIXTO_CALL_TIMEOUT))
         except:
             print('Cannot find Mixto envars or config file')
 except:
     raise MissingRequired("Cannot read Mixto config")
 
+if MIXTO_PREWARM and MIXTO_HOST is not None:
+    Thread(target=_prewarm, daemon=True).start()
+
 
 class MixtoGDB(gdb.Command):
     def __init__(self):
@@ -7,15 +7,27 @@
 
 
 # Mixto python2 lite sdk
-from urllib2 import Request, urlopen, HTTPError
-from urllib import urlencode
-from urlparse import urljoin
+from httplib import HTTPConnection, HTTPSConnection, BadStatusLine
+from urllib import getproxies, proxy_bypass, unquote, urlencode
+from urlparse import urljoin, urlparse
+from base64 import b64encode
+from threading import Lock
+import socket
+import time
 import os
 import json
 
 MIXTO_ENTRY_ID = os.getenv("MIXTO_ENTRY_ID")
 MIXTO_HOST = os.getenv("MIXTO_HOST")
 MIXTO_API_KEY = os.getenv("MIXTO_API_KEY")
+# timeouts in seconds. MIXTO_CALL_TIMEOUT bounds a whole call, reconnects included
+MIXTO_CONNECT_TIMEOUT = float(os.getenv("MIXTO_CONNECT_TIMEOUT", 5))
+MIXTO_READ_TIMEOUT = float(os.getenv("MIXTO_READ_TIMEOUT", 30))
+MIXTO_CALL_TIMEOUT = float(os.getenv("MIXTO_CALL_TIMEOUT", 60))
+
+# statuses whose Location is followed, like urlopen does
+REDIRECTS = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
 
 
 class MissingRequired(Exception):
@@ -30,6 +42,39 @@ class BadResponse(Exception):
     pass
 
 
+class RequestTimeout(Exception):
+    """Mixto API call timed out or ran past its deadline"""
+
+    pass
+
+
+class _DeadlineSocket(object):
+    """Socket of the pooled connection that sets its timeout from
+    next_timeout before every recv, so a response trickling in byte by byte
+    cannot outlive the call deadline"""
+
+    def __init__(self, sock):
+        self._sock = sock
+        self.next_timeout = None
+
+    def recv(self, size, *args):
+        if self.next_timeout is not None:
+            self._sock.settimeout(self.next_timeout())
+        return self._sock.recv(size, *args)
+
+    def makefile(self, mode="r", bufsize=-1):
+        # httplib reads the response through this, so its recvs come back here
+        return socket._fileobject(self, mode, bufsize)
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+def _timed_out(e):
+    # ssl read timeouts are not always socket.timeout on python2
+    return isinstance(e, socket.timeout) or "timed out" in str(e)
+
+
 class MixtoLite:
     def __init__(self, host=None, api_key=None):
         self.host = host
@@ -37,6 +82,12 @@ class MixtoLite:
         self.workspace_id = None
         self.status = 0
         self.commit_type = "tool"
+        self.connect_timeout = MIXTO_CONNECT_TIMEOUT
+        self.read_timeout = MIXTO_READ_TIMEOUT
+        self.call_timeout = MIXTO_CALL_TIMEOUT
+        # single keep-alive connection reused across requests
+        self._conn = None
+        self._conn_lock = Lock()
 
         # if envars are set, always use those values
         if MIXTO_HOST is not None and self.host is None:
@@ -53,6 +104,10 @@ class MixtoLite:
                     self.host = j["host"]
                     self.api_key = j["api_key"]
                     self.workspace_id = j["workspace_id"]
+                    # optional timeouts, envars still take precedence
+                    for k in ("connect_timeout", "read_timeout", "call_timeout"):
+                        if k in j and os.getenv("MIXTO_" + k.upper()) is None:
+                            setattr(self, k, float(j[k]))
             except:
                 print("Cannot read mixto config file")
                 raise
@@ -62,6 +117,8 @@ class MixtoLite:
         uri,
         data={},
         is_query=False,
+        timeout=None,
+        deadline=None,
     ):
         """Generic method helpful in extending this lib for other Mixto
         API calls. Refer to Mixto docs for all available API endpoints.
@@ -71,48 +128,151 @@ class MixtoLite:
             uri (str): Mixto URI.
             data (dict, optional): Body or query params. Defaults to {}.
             is_query (bool, optional): True if query params. Defaults to False.
+            timeout (float, optional): Budget in seconds for this call. Defaults to call_timeout.
+            deadline (float, optional): Absolute time.time() deadline passed down
+                by batch operations. The earlier of timeout and deadline wins.
 
         Raises:
             BadResponse: If status code is not 200, raises exception
+            RequestTimeout: If the call times out or runs past its deadline
 
         Returns:
             None: None
         """
         # add base url with endpoint
-        url = urljoin(str(self.host), uri)
+        path = urlparse(urljoin(str(self.host), uri)).path
+        headers = {
+            "x-api-key": self.api_key,
+            "user-agent": "mixto-lite-py2",
+        }
         # if query params, add data as query params
         if is_query:
-            data = urlencode(data)
-            url += "?" + data
+            method = "GET"
+            path += "?" + urlencode(data)
+            data = None
         else:
             # add as json body
+            method = "POST"
             data = json.dumps(data)
-        # create request object
-        req = Request(
-            url=url,
-            headers={
-                "x-api-key": self.api_key,
-                "user-agent": "mixto-lite-py2",
-            },
-        )
-        # add json content type if post body
-        if not is_query:
-            req.add_header("Content-Type", "application/json")
-            req.add_data(data)
+            headers["Content-Type"] = "application/json"
 
         # send request
+        budget = time.time() + (self.call_timeout if timeout is None else timeout)
+        if deadline is not None:
+            budget = min(budget, deadline)
+        body = self._send(method, path, data, headers, budget)
+        if self.status > 300:
+            raise BadResponse(self.status, body)
+        else:
+            return body
+
+    def _proxy(self, url):
+        """Proxy address and auth headers for url from HTTP(S)_PROXY, None if
+        there is no proxy for its scheme or NO_PROXY excludes its host"""
+        u = urlparse(url)
+        proxy = getproxies().get(u.scheme)
+        if not proxy or proxy_bypass(u.hostname or ""):
+            return None
+        p = urlparse(proxy if "//" in proxy else "http://" + proxy)
+        headers = {}
+        if p.username:
+            creds = "%s:%s" % (unquote(p.username), unquote(p.password or ""))
+            headers["Proxy-Authorization"] = "Basic " + b64encode(creds)
+        return p.netloc.rpartition("@")[2], headers
+
+    def _new_connection(self, url=None):
+        """New, not yet connected connection to the origin of url, the Mixto
+        host by default. https is tunnelled through the proxy with CONNECT"""
+        u = urlparse(url or str(self.host))
+        cls = HTTPSConnection if u.scheme == "https" else HTTPConnection
+        proxy = self._proxy(u.geturl())
+        if proxy is None:
+            return cls(u.netloc)
+        conn = cls(proxy[0])
+        if u.scheme == "https":
+            conn.set_tunnel(u.hostname, u.port, proxy[1])
+        return conn
+
+    def _connection(self):
+        """Get the pooled connection to the Mixto host, creating it if needed"""
+        if self._conn is None:
+            self._conn = self._new_connection()
+        return self._conn
+
+    def _send(self, method, path, data, headers, deadline):
+        """Send a request over the pooled connection and return the raw body.
+        Redirects are followed the way urlopen does: GET and HEAD go to the new
+        location, a POST answered with 301, 302 or 303 becomes a bodiless GET"""
+        url = urljoin(str(self.host), path)
+        with self._conn_lock:
+            for _ in range(MAX_REDIRECTS + 1):
+                body, location = self._request(method, url, data, headers, deadline)
+                if location is None:
+                    return body
+                if method not in ("GET", "HEAD"):
+                    if method != "POST" or self.status not in (301, 302, 303):
+                        return body
+                    method, data = "GET", None
+                    headers = dict((k, v) for k, v in headers.items() if k != "Content-Type")
+                url = urljoin(url, location)
+        raise BadResponse(self.status, "More than %d redirects" % MAX_REDIRECTS)
+
+    def _request(self, method, url, data, headers, deadline):
+        """One request to url. The Mixto host is reached over the pooled
+        connection, other hosts a redirect points to over a one-off one"""
+        if urlparse(url)[:2] != urlparse(str(self.host))[:2]:
+            conn = self._new_connection(url)
+            try:
+                return self._roundtrip(conn, method, url, data, headers, deadline)
+            finally:
+                conn.close()
+        conn = self._connection()
+        try:
+            return self._roundtrip(conn, method, url, data, headers, deadline)
+        except (BadStatusLine, socket.error):
+            # the server dropped the idle keep-alive connection, reopen once.
+            # timeouts are raised as RequestTimeout and not retried
+            return self._roundtrip(conn, method, url, data, headers, deadline)
+
+    def _roundtrip(self, conn, method, url, data, headers, deadline):
+        u = urlparse(url)
+        target = u.path + ("?" + u.query if u.query else "")
+        proxy = self._proxy(url) if u.scheme == "http" else None
+        if proxy is not None:
+            # plain http goes to the proxy with the absolute url as target
+            target = url
+            headers = dict(headers, **proxy[1])
         try:
-            res = urlopen(req)
+            if conn.sock is None:
+                conn.timeout = self._remaining(deadline, self.connect_timeout)
+                conn.connect()
+                conn.sock = _DeadlineSocket(conn.sock)
+            conn.sock.settimeout(self._remaining(deadline, self.read_timeout))
+            conn.sock.next_timeout = lambda: self._remaining(deadline, self.read_timeout)
+            conn.request(method, target, data, headers)
+            res = conn.getresponse()
+            self.status = res.status
             body = res.read()
-            self.status = res.getcode()
-            if self.status > 300:
-                raise BadResponse(self.status, res)
-            else:
-                return body
-        except HTTPError as e:
-            raise BadResponse(e.code, e.read())
-
-    def AddCommit(self, data, entry_id=None, title=""):
+            if res.status in REDIRECTS:
+                return body, res.getheader("Location")
+            return body, None
+        except socket.error as e:
+            conn.close()
+            if _timed_out(e):
+                raise RequestTimeout("Mixto did not respond in time: %s %s" % (method, u.path))
+            raise
+        except Exception:
+            conn.close()
+            raise
+
+    def _remaining(self, deadline, limit):
+        """Socket timeout capped by what is left of the call deadline"""
+        left = deadline - time.time()
+        if left <= 0:
+            raise RequestTimeout("Mixto call ran past its deadline")
+        return min(left, limit)
+
+    def AddCommit(self, data, entry_id=None, title="", deadline=None):
         """Add/commit data to an entry. This is the primary functionality of
         an integration
 
@@ -120,6 +280,7 @@ class MixtoLite:
             data (str): Data to add
             entry_id (str, optional): Entry ID. Will use MIXTO_ENTRY_ID as primary. Defaults to None.
             title (str, optional): Title for commit. Defaults to "Untitled".
+            deadline (float, optional): Absolute time.time() deadline from a batch operation.
 
         Raises:
             MissingRequired: If entry id is missing
@@ -140,6 +301,7 @@ class MixtoLite:
                 "entry_id": entry_id,
                 "workspace_id": self.workspace_id,
             },
+            deadline=deadline,
         )
 
     def GetEntryIDs(self):
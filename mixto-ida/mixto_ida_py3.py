@@ -1,9 +1,14 @@
 # Mixto lite lib for python3
 
-from typing import List
-from urllib.request import Request, urlopen
-from urllib.parse import urlencode, urljoin
-from urllib.error import HTTPError
+from typing import List, Union, Dict, Tuple
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.parse import unquote, urlencode, urljoin, urlparse
+from urllib.request import getproxies, proxy_bypass
+from base64 import b64encode
+from threading import Lock, Thread
+from time import monotonic
+import io
+import socket
 from pathlib import Path
 from os import getenv
 import json
@@ -11,6 +16,16 @@ import json
 MIXTO_ENTRY_ID = getenv("MIXTO_ENTRY_ID")
 MIXTO_HOST = getenv("MIXTO_HOST")
 MIXTO_API_KEY = getenv("MIXTO_API_KEY")
+# timeouts in seconds. MIXTO_CALL_TIMEOUT bounds a whole call, reconnects included
+MIXTO_CONNECT_TIMEOUT = float(getenv("MIXTO_CONNECT_TIMEOUT", 5))
+MIXTO_READ_TIMEOUT = float(getenv("MIXTO_READ_TIMEOUT", 30))
+MIXTO_CALL_TIMEOUT = float(getenv("MIXTO_CALL_TIMEOUT", 60))
+
+# statuses whose Location is followed, like urlopen does
+REDIRECTS = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+# set MIXTO_PREWARM=0 to skip warming up the connection when the plugin loads
+MIXTO_PREWARM = getenv("MIXTO_PREWARM", "1") != "0"
 
 
 class MissingRequired(Exception):
@@ -25,6 +40,34 @@ class BadResponse(Exception):
     pass
 
 
+class RequestTimeout(Exception):
+    """Mixto API call timed out or ran past its deadline"""
+
+    pass
+
+
+class _DeadlineSocket:
+    """Socket of the pooled connection that sets its timeout from
+    next_timeout before every recv, so a response trickling in byte by byte
+    cannot outlive the call deadline"""
+
+    def __init__(self, sock: socket.socket):
+        self._sock = sock
+        self.next_timeout = None
+
+    def recv_into(self, *args) -> int:
+        if self.next_timeout is not None:
+            self._sock.settimeout(self.next_timeout())
+        return self._sock.recv_into(*args)
+
+    def makefile(self, mode: str = "rb") -> io.BufferedReader:
+        # http.client reads the response through this, so its recvs come back here
+        return io.BufferedReader(socket.SocketIO(self, "rb"))
+
+    def __getattr__(self, name: str):
+        return getattr(self._sock, name)
+
+
 class MixtoLite:
     def __init__(self, host: str = None, api_key: str = None) -> None:
         super().__init__()
@@ -34,6 +77,12 @@ class MixtoLite:
         self.status = 0
         self.commit_type = "tool"
         self.entry_id = None
+        self.connect_timeout = MIXTO_CONNECT_TIMEOUT
+        self.read_timeout = MIXTO_READ_TIMEOUT
+        self.call_timeout = MIXTO_CALL_TIMEOUT
+        # single keep-alive connection reused across requests
+        self._conn = None
+        self._conn_lock = Lock()
 
         # if envars are set, always use those values
         if MIXTO_HOST is not None and self.host is None:
@@ -50,6 +99,10 @@ class MixtoLite:
                     self.host = j["host"]
                     self.api_key = j["api_key"]
                     self.workspace = j["workspace"]
+                    # optional timeouts, envars still take precedence
+                    for k in ("connect_timeout", "read_timeout", "call_timeout"):
+                        if k in j and getenv("MIXTO_" + k.upper()) is None:
+                            setattr(self, k, float(j[k]))
             except:
                 print("Cannot read mixto config file")
                 raise
@@ -61,6 +114,8 @@ class MixtoLite:
         body: dict = {},
         query: dict = {},
         isJSON: bool = True,
+        timeout: Union[float, None] = None,
+        deadline: Union[float, None] = None,
     ):
         """Generic method helpful in extending this lib for other Mixto
         API calls. Refer to Mixto docs for all available API endpoints.
@@ -71,10 +126,13 @@ class MixtoLite:
             body (dict, optional): Body. Defaults to {}.
             query (dict, optional): Query params. Defaults to {}.
             isJSON (bool, optional): If the response is of type JSON. Defaults to True.
+            timeout (float, optional): Budget in seconds for this call. Defaults to call_timeout.
+            deadline (float, optional): Absolute time.monotonic() deadline passed down
+                by batch operations. The earlier of timeout and deadline wins.
 
         Raises:
             BadResponse: [description]
-            BadResponse: [description]
+            RequestTimeout: If the call times out or runs past its deadline
 
         Returns:
             [type]: [description]
@@ -83,31 +141,185 @@ class MixtoLite:
         q = ""
         if query:
             q = "?" + urlencode(query)
-        req = Request(
-            method=method.upper(),
-            url=url + q,
-            data=json.dumps(body).encode(),
-            headers={
-                "x-api-key": self.api_key,
-                "user-agent": "mixto-lite-py",
-            },
-        )
+        headers = {
+            "x-api-key": self.api_key,
+            "user-agent": "mixto-lite-py",
+        }
         if body:
-            req.add_header("Content-Type", "application/json")
+            headers["Content-Type"] = "application/json"
+        budget = monotonic() + (self.call_timeout if timeout is None else timeout)
+        data = self._send(
+            method.upper(),
+            urlparse(url).path + q,
+            json.dumps(body).encode(),
+            headers,
+            budget if deadline is None else min(budget, deadline),
+        )
+        if self.status > 300:
+            raise BadResponse(self.status, data)
+        body = data.decode()
+        if isJSON:
+            return json.loads(str(body))
+        else:
+            return body
+
+    def _proxy(self, url: str) -> Union[Tuple[str, Dict[str, str]], None]:
+        """Proxy address and auth headers for url from HTTP(S)_PROXY, None if
+        there is no proxy for its scheme or NO_PROXY excludes its host"""
+        u = urlparse(url)
+        proxy = getproxies().get(u.scheme)
+        if not proxy or proxy_bypass(u.hostname or ""):
+            return None
+        p = urlparse(proxy if "//" in proxy else "http://" + proxy)
+        headers = {}
+        if p.username:
+            creds = f"{unquote(p.username)}:{unquote(p.password or '')}"
+            headers["Proxy-Authorization"] = "Basic " + b64encode(creds.encode()).decode()
+        return p.netloc.rpartition("@")[2], headers
+
+    def _new_connection(self, url: Union[str, None] = None) -> HTTPConnection:
+        """New, not yet connected connection to the origin of url, the Mixto
+        host by default. https is tunnelled through the proxy with CONNECT"""
+        u = urlparse(url or str(self.host))
+        cls = HTTPSConnection if u.scheme == "https" else HTTPConnection
+        proxy = self._proxy(u.geturl())
+        if proxy is None:
+            return cls(u.netloc)
+        conn = cls(proxy[0])
+        if u.scheme == "https":
+            conn.set_tunnel(u.hostname, u.port, proxy[1])
+        return conn
+
+    def _connection(self) -> HTTPConnection:
+        """Get the pooled connection to the Mixto host, creating it if needed"""
+        if self._conn is None:
+            self._conn = self._new_connection()
+        return self._conn
+
+    def _send(
+        self, method: str, path: str, data: bytes, headers: dict, deadline: float
+    ) -> bytes:
+        """Send a request over the pooled connection and return the raw body.
+        Redirects are followed the way urlopen does: GET and HEAD go to the new
+        location, a POST answered with 301, 302 or 303 becomes a bodiless GET"""
+        url = urljoin(str(self.host), path)
+        with self._conn_lock:
+            for _ in range(MAX_REDIRECTS + 1):
+                body, location = self._request(method, url, data, headers, deadline)
+                if location is None:
+                    return body
+                if method not in ("GET", "HEAD"):
+                    if method != "POST" or self.status not in (301, 302, 303):
+                        return body
+                    method, data = "GET", None
+                    headers = {k: v for k, v in headers.items() if k != "Content-Type"}
+                url = urljoin(url, location)
+        raise BadResponse(self.status, f"More than {MAX_REDIRECTS} redirects")
+
+    def _request(
+        self, method: str, url: str, data: bytes, headers: dict, deadline: float
+    ) -> Tuple[bytes, Union[str, None]]:
+        """One request to url. The Mixto host is reached over the pooled
+        connection, other hosts a redirect points to over a one-off one"""
+        if urlparse(url)[:2] != urlparse(str(self.host))[:2]:
+            conn = self._new_connection(url)
+            try:
+                return self._roundtrip(conn, method, url, data, headers, deadline)
+            finally:
+                conn.close()
+        conn = self._connection()
         try:
-            res = urlopen(req)
-            body = res.read().decode()
-            self.status = res.getcode()
-            if self.status > 300:
-                raise BadResponse(self.status, res)
-            if isJSON:
-                return json.loads(str(body))
-            else:
-                return body
-        except HTTPError as e:
-            raise BadResponse(e.code, e.read())
+            return self._roundtrip(conn, method, url, data, headers, deadline)
+        except (ConnectionResetError, BrokenPipeError):
+            # the server dropped the idle keep-alive connection, reopen once
+            return self._roundtrip(conn, method, url, data, headers, deadline)
+
+    def _roundtrip(
+        self,
+        conn: HTTPConnection,
+        method: str,
+        url: str,
+        data: bytes,
+        headers: dict,
+        deadline: float,
+    ) -> Tuple[bytes, Union[str, None]]:
+        u = urlparse(url)
+        target = u.path + ("?" + u.query if u.query else "")
+        proxy = self._proxy(url) if u.scheme == "http" else None
+        if proxy is not None:
+            # plain http goes to the proxy with the absolute url as target
+            target = url
+            headers = {**headers, **proxy[1]}
+        try:
+            if conn.sock is None:
+                conn.timeout = self._remaining(deadline, self.connect_timeout)
+                conn.connect()
+                conn.sock = _DeadlineSocket(conn.sock)
+            conn.sock.settimeout(self._remaining(deadline, self.read_timeout))
+            conn.sock.next_timeout = lambda: self._remaining(deadline, self.read_timeout)
+            conn.request(method, target, body=data, headers=headers)
+            res = conn.getresponse()
+            self.status = res.status
+            body = res.read()
+            if res.status in REDIRECTS:
+                return body, res.getheader("Location")
+            return body, None
+        except socket.timeout:
+            conn.close()
+            raise RequestTimeout(f"Mixto did not respond in time: {method} {u.path}")
+        except Exception:
+            conn.close()
+            raise
+
+    def _remaining(self, deadline: float, limit: float) -> float:
+        """Socket timeout capped by what is left of the call deadline"""
+        left = deadline - monotonic()
+        if left <= 0:
+            raise RequestTimeout("Mixto call ran past its deadline")
+        return min(left, limit)
+
+    def Prewarm(self, background: bool = True) -> Union[Thread, None]:
+        """Resolve the host and open the pooled connection so the first real
+        command does not pay the setup cost. The connection is opened outside
+        of the connection lock and only kept if no command opened one in the
+        meantime, so a slow prewarm never holds up a command. Errors are
+        ignored here and will surface on the first real request.
+
+        Args:
+            background (bool, optional): Run in a daemon thread. Defaults to True.
+
+        Returns:
+            Union[Thread, None]: The prewarm thread when run in the background
+        """
 
-    def AddCommit(self, data: str, entry_id: str = None, title: str = ""):
+        def _prewarm():
+            try:
+                conn = self._new_connection()
+                conn.timeout = self.connect_timeout
+                conn.connect()
+                conn.sock = _DeadlineSocket(conn.sock)
+            except Exception:
+                return
+            with self._conn_lock:
+                if self._conn is None:
+                    self._conn = conn
+                    return
+            conn.close()
+
+        if not background:
+            _prewarm()
+            return None
+        thread = Thread(target=_prewarm, daemon=True)
+        thread.start()
+        return thread
+
+    def AddCommit(
+        self,
+        data: str,
+        entry_id: str = None,
+        title: str = "",
+        deadline: Union[float, None] = None,
+    ):
         """Add/commit data to an entry. This is the primary functionality of
         an integration
 
@@ -115,6 +327,7 @@ class MixtoLite:
             data (str): Data to add
             entry_id (str, optional): Entry ID. Will use MIXTO_ENTRY_ID as primary. Defaults to None.
             title (str, optional): Title for commit. Defaults to "Untitled".
+            deadline (float, optional): Absolute time.monotonic() deadline from a batch operation.
 
         Raises:
             MissingRequired: If entry id is missing
@@ -130,6 +343,7 @@ class MixtoLite:
             "POST",
             "/api/entry/{}/{}/commit".format(self.workspace, e_id),
             {"data": data, "type": self.commit_type, "title": title},
+            deadline=deadline,
         )
         return r
 
@@ -150,7 +364,7 @@ class MixtoLite:
         )
 
     def GetEntryIDs(self) -> List[str]:
-        """Get all entry ids filtered by the current workspace
+        """Get all entry ids filtered by the current workspace.
 
         Returns:
             List[str]: List of entry ids
@@ -372,4 +586,6 @@ class mixto_t(idaapi.plugin_t):
 
 
 def PLUGIN_ENTRY():
+    if MIXTO_PREWARM:
+        mixto_t.mixto.Prewarm()
     return mixto_t()
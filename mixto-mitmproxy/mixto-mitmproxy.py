@@ -1,35 +1,150 @@
 """Script to integrate Mixto with mitmproxy"""
-from mitmproxy import ctx, flow
+import queue
+import threading
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from typing import Any, Callable, Dict, List, Union
+from mitmproxy import ctx, exceptions, flow, flowfilter
 from mitmproxy.command import command
 import mitmproxy.net.http.http1.assemble as assemble
 from mitmproxy.addons.export import curl_command, httpie_command
-from mixto import MixtoLite
+from mixto import MixtoLite, MIXTO_ENTRY_ID
 
 __version__ = "1.0.0"
 __author__ = "Hapsida @securisec"
 
 
-class mixtoMitmproxy:
-    def __init__(self):
+# captured flows waiting to be serialized. Flows captured while it is full are dropped
+CAPTURE_QUEUE_SIZE = 1000
+# flows the commands serialize at once, and commit in one request
+COMMAND_WORKERS = 8
+COMMAND_BATCH = 50
+COMMAND_BYTES = 4 * 1024 * 1024
+# seconds a command may spend committing, as it blocks mitmproxy meanwhile
+COMMAND_TIMEOUT = 60
+
+
+def _flow_title(flow: flow.Flow, title_postfix: str) -> str:
+    return "(Mitmproxy): {} {} - {}".format(
+        flow.request.method, flow.request.host[0:60], title_postfix
+    )
+
+
+def _response(flow: flow.Flow):
+    if flow.response is None:
+        raise ValueError("flow has no response")
+    return flow.response
+
+
+def _with_commands(data: str, flow: flow.Flow) -> str:
+    return "{}\n\n{}\nCurl:\n{}\n\nHttpie:\n{}".format(
+        data, "-" * 20, curl_command(flow), httpie_command(flow)
+    )
+
+
+def _flow_data(flow: flow.Flow) -> str:
+    """Request and response of flow, followed by its curl and httpie commands"""
+    reqdata = assemble.assemble_request(flow.request).decode(
+        "utf-8", errors="backslashreplace"
+    )
+    resdata = assemble.assemble_response(_response(flow)).decode(
+        "utf-8", errors="backslashreplace"
+    )
+    return _with_commands("\n\n\n".join([reqdata, resdata]), flow)
+
+
+class _Capture(threading.Thread):
+    """Commits captured flows to Mixto from its own thread. Flows are
+    serialized here rather than on the event loop, and sent as one request
+    per batch once a batch holds batch_size flows or max_bytes of data, or
+    its first flow has waited interval seconds. It has its own MixtoLite, so
+    its requests never wait on the commands
+    """
+
+    def __init__(self, interval: int, batch_size: int, max_bytes: int):
+        super().__init__(name="mixto-capture", daemon=True)
         self.mixto = MixtoLite()
         self.mixto.commit_type = "tool"
-        self.mitm_host = None
-        self.mitm_method = None
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.queue: queue.Queue = queue.Queue(CAPTURE_QUEUE_SIZE)
+        self.dropped = 0
 
-    def _get_data(self, data, flow):
-        return "{}\n\n{}\nCurl:\n{}\n\nHttpie:\n{}".format(
-            data, "-" * 20, curl_command(flow), httpie_command(flow)
-        )
+    def submit(self, entry_id: str, flow: flow.Flow) -> None:
+        """Queue a copy of flow without waiting, so later changes to the flow,
+        like a replay, do not change what is committed
+        """
+        try:
+            self.queue.put_nowait((entry_id, flow.copy()))
+        except queue.Full:
+            self.dropped += 1
 
-    def _get_title(self, title_postfix: str):
-        return "(Mitmproxy): {} {} - {}".format(
-            self.mitm_method, self.mitm_host[0:60], title_postfix
-        )
+    def stop(self) -> None:
+        """Commit the flows still queued and stop the thread"""
+        self.queue.put(None)
+        self.join()
+
+    def run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        size = 0
+        started = 0.0
+        while True:
+            timeout = None
+            if batch:
+                timeout = max(0, started + self.interval - monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            if item:
+                entry_id, f = item
+                try:
+                    data = _flow_data(f)
+                except Exception as e:
+                    ctx.log.error(f"[-] Mixto capture could not serialize a flow: {e}")
+                    continue
+                if not batch:
+                    started = monotonic()
+                batch.append(
+                    {
+                        "entry_id": entry_id,
+                        "data": data,
+                        "title": _flow_title(f, "capture"),
+                    }
+                )
+                size += len(data)
+            if batch and (
+                not item
+                or len(batch) >= self.batch_size
+                or size >= self.max_bytes
+                or monotonic() - started >= self.interval
+            ):
+                self.send(batch)
+                batch, size = [], 0
+            if item is None:
+                return
+
+    def send(self, batch: List[Dict[str, Any]]) -> None:
+        dropped, self.dropped = self.dropped, 0
+        try:
+            self.mixto.AddCommits(batch)
+            msg = f"[+] Captured {len(batch)} flows to Mixto"
+            if dropped:
+                msg += f", {dropped} dropped while the queue was full"
+            ctx.log.info(msg)
+        except Exception as e:
+            ctx.log.error(f"[-] Mixto capture failed to commit {len(batch)} flows: {e}")
 
-    def _success_msg(self):
-        msg = f"[+] Successfully committed to Mixto {self.get_entry_id()}"
-        print(msg)
-        ctx.log.info(msg)
+
+class mixtoMitmproxy:
+    def __init__(self):
+        self.mixto = MixtoLite()
+        self.mixto.commit_type = "tool"
+        self.capture_filter: Union[flowfilter.TFilter, None] = None
+        self.capture: Union[_Capture, None] = None
+        self._warned_entry_id = False
 
     def load(self, loader):
         loader.add_option(
@@ -38,6 +153,75 @@ class mixtoMitmproxy:
             default="",
             help="The entry ID to commit data to",
         )
+        loader.add_option(
+            name="mixto_capture",
+            typespec=str,
+            default="",
+            help="Commit every flow matching this filter expression once it has a response, "
+            "for example '~d target.com & ~c 500'. Empty disables capture",
+        )
+        loader.add_option(
+            name="mixto_capture_interval",
+            typespec=int,
+            default=5,
+            help="Seconds a captured flow waits for more flows to be committed with",
+        )
+        loader.add_option(
+            name="mixto_capture_batch",
+            typespec=int,
+            default=50,
+            help="Captured flows committed in one request",
+        )
+        loader.add_option(
+            name="mixto_capture_bytes",
+            typespec=int,
+            default=4 * 1024 * 1024,
+            help="Captured data committed in one request",
+        )
+
+    def configure(self, updated):
+        if "mixto_capture" in updated:
+            expr = ctx.options.mixto_capture
+            if expr:
+                try:
+                    self.capture_filter = flowfilter.parse(expr)
+                except ValueError as e:
+                    raise exceptions.OptionsError(f"Invalid mixto_capture filter: {e}")
+                # older mitmproxy versions return None for invalid expressions
+                if self.capture_filter is None:
+                    raise exceptions.OptionsError(f"Invalid mixto_capture filter: {expr}")
+            else:
+                self.capture_filter = None
+        if self.capture_filter is not None and self.capture is None:
+            self.capture = _Capture(
+                ctx.options.mixto_capture_interval,
+                ctx.options.mixto_capture_batch,
+                ctx.options.mixto_capture_bytes,
+            )
+            self.capture.start()
+        elif self.capture_filter is None and self.capture is not None:
+            self.capture.stop()
+            self.capture = None
+        if self.capture is not None:
+            self.capture.interval = ctx.options.mixto_capture_interval
+            self.capture.batch_size = ctx.options.mixto_capture_batch
+            self.capture.max_bytes = ctx.options.mixto_capture_bytes
+
+    def response(self, flow: flow.Flow) -> None:
+        if self.capture is None or not flowfilter.match(self.capture_filter, flow):
+            return
+        entry_id = MIXTO_ENTRY_ID or ctx.options.mixto_entry_id
+        if not entry_id:
+            if not self._warned_entry_id:
+                ctx.log.warn("[-] Mixto capture needs mixto_entry_id to be set")
+                self._warned_entry_id = True
+            return
+        self.capture.submit(entry_id, flow)
+
+    def done(self):
+        if self.capture is not None:
+            self.capture.stop()
+            self.capture = None
 
     def get_entry_id(self):
         mixto_entry_id = ctx.options.mixto_entry_id
@@ -52,112 +236,145 @@ class mixtoMitmproxy:
         print(msg)
         ctx.log.info(msg)
 
-    @command("mixto.request")
-    def req(self, flow: flow.Flow) -> None:
+    def _commit_flows(
+        self,
+        flows: Sequence[flow.Flow],
+        serialize: Callable[[flow.Flow], str],
+        title_postfix: str,
+    ) -> None:
+        """Serialize flows concurrently and commit them in as few requests as
+        COMMAND_BATCH and COMMAND_BYTES allow, then log one summary line. Flows
+        that cannot be serialized, like flows without a response for the
+        response commands, are skipped. All requests share one COMMAND_TIMEOUT
+        deadline, flows left when it runs out are reported as uncommitted
+        """
         mixto_entry_id = self.get_entry_id()
-        self.mitm_method = flow.request.method
-        self.mitm_host = flow.request.host
-        self.mixto.AddCommit(
-            data=self._get_data(
-                assemble.assemble_request(flow.request).decode(
+
+        def one(f: flow.Flow) -> Union[Dict[str, Any], Exception]:
+            try:
+                return {
+                    "entry_id": mixto_entry_id,
+                    "data": serialize(f),
+                    "title": _flow_title(f, title_postfix),
+                }
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=COMMAND_WORKERS) as pool:
+            serialized = list(pool.map(one, flows))
+        commits = [c for c in serialized if not isinstance(c, Exception)]
+        skipped = [c for c in serialized if isinstance(c, Exception)]
+
+        batches: List[List[Dict[str, Any]]] = []
+        size = 0
+        for c in commits:
+            if not batches or len(batches[-1]) >= COMMAND_BATCH or size + len(c["data"]) > COMMAND_BYTES:
+                batches.append([])
+                size = 0
+            batches[-1].append(c)
+            size += len(c["data"])
+
+        added = 0
+        error = None
+        deadline = monotonic() + COMMAND_TIMEOUT
+        for batch in batches:
+            try:
+                self.mixto.AddCommits(batch, deadline=deadline)
+            except Exception as e:
+                error = e
+                break
+            added += len(batch)
+
+        msg = "Committed {} of {} flows to Mixto {} in {} request{}".format(
+            added,
+            len(flows),
+            mixto_entry_id,
+            len(batches),
+            "" if len(batches) == 1 else "s",
+        )
+        if skipped:
+            msg += f", {len(skipped)} skipped ({skipped[0]})"
+        if error is not None:
+            msg = f"[-] {msg}, {len(commits) - added} left uncommitted, stopped by: {error}"
+            print(msg)
+            ctx.log.error(msg)
+        else:
+            msg = f"[+] {msg}"
+            print(msg)
+            ctx.log.info(msg)
+
+    @command("mixto.request")
+    def req(self, flows: Sequence[flow.Flow]) -> None:
+        self._commit_flows(
+            flows,
+            lambda f: _with_commands(
+                assemble.assemble_request(f.request).decode(
                     "utf-8", errors="backslashreplace"
                 ),
-                flow,
+                f,
             ),
-            entry_id=mixto_entry_id,
-            title=self._get_title("request"),
+            "request",
         )
-        self._success_msg()
 
     @command("mixto.request_header")
-    def req_header(self, flow: flow.Flow) -> None:
-        mixto_entry_id = self.get_entry_id()
-        self.mitm_method = flow.request.method
-        self.mitm_host = flow.request.host
-        self.mixto.AddCommit(
-            data=self._get_data(
-                assemble.assemble_request_head(flow.request).decode(
+    def req_header(self, flows: Sequence[flow.Flow]) -> None:
+        self._commit_flows(
+            flows,
+            lambda f: _with_commands(
+                assemble.assemble_request_head(f.request).decode(
                     "utf-8", errors="backslashreplace"
                 ),
-                flow,
+                f,
             ),
-            entry_id=mixto_entry_id,
-            title=self._get_title("request.header"),
+            "request.header",
         )
-        self._success_msg()
 
     @command("mixto.response_header")
-    def res_header(self, flow: flow.Flow) -> None:
-        mixto_entry_id = self.get_entry_id()
-        self.mitm_method = flow.request.method
-        self.mitm_host = flow.request.host
-        self.mixto.AddCommit(
-            data=self._get_data(
-                assemble.assemble_response_head(flow.response).decode(
+    def res_header(self, flows: Sequence[flow.Flow]) -> None:
+        self._commit_flows(
+            flows,
+            lambda f: _with_commands(
+                assemble.assemble_response_head(_response(f)).decode(
                     "utf-8", errors="backslashreplace"
                 ),
-                flow,
+                f,
             ),
-            entry_id=mixto_entry_id,
-            title=self._get_title("response.header"),
+            "response.header",
         )
-        self._success_msg()
 
     @command("mixto.response")
-    def res(self, flow: flow.Flow) -> None:
-        mixto_entry_id = self.get_entry_id()
-        self.mitm_method = flow.request.method
-        self.mitm_host = flow.request.host
-        self.mixto.AddCommit(
-            data=self._get_data(
-                assemble.assemble_response(flow.response).decode(
+    def res(self, flows: Sequence[flow.Flow]) -> None:
+        self._commit_flows(
+            flows,
+            lambda f: _with_commands(
+                assemble.assemble_response(_response(f)).decode(
                     "utf-8", errors="backslashreplace"
                 ),
-                flow,
+                f,
             ),
-            entry_id=mixto_entry_id,
-            title=self._get_title("response"),
+            "response",
         )
-        self._success_msg()
 
     @command("mixto.full")
-    def full(self, flow: flow.Flow) -> None:
-        mixto_entry_id = self.get_entry_id()
-        self.mitm_method = flow.request.method
-        self.mitm_host = flow.request.host
-        reqdata = assemble.assemble_request(flow.request).decode(
-            "utf-8", errors="backslashreplace"
-        )
-        resdata = assemble.assemble_response(flow.response).decode(
-            "utf-8", errors="backslashreplace"
-        )
-        data = "\n\n\n".join([reqdata, resdata])
-        self.mixto.AddCommit(
-            data=self._get_data(data, flow),
-            entry_id=mixto_entry_id,
-            title=self._get_title("request.response"),
-        )
-        self._success_msg()
+    def full(self, flows: Sequence[flow.Flow]) -> None:
+        self._commit_flows(flows, _flow_data, "request.response")
 
     @command("mixto.cert")
-    def certificate(self, flow: flow.Flow) -> None:
-        try:
-            mixto_entry_id = self.get_entry_id()
-            self.mitm_method = flow.request.method
-            self.mitm_host = flow.request.host
-            server = flow.server_conn
-            client = flow.client_conn
-            addr = server.ip_address
-            data = "Server Host: {}\n".format(flow.request.host)
+    def certificate(self, flows: Sequence[flow.Flow]) -> None:
+        def serialize(f: flow.Flow) -> str:
+            if f.client_conn.mitmcert is None:
+                raise ValueError("flow has no certificate")
+            addr = f.server_conn.ip_address
+            data = "Server Host: {}\n".format(f.request.host)
             data += "Server Address: {}:{}\n\n".format(addr[0], addr[1])
             data += "X509 Certificate:\n{}\n\n".format(
-                client.mitmcert.to_pem().decode("utf-8", errors="backslashreplace")
+                f.client_conn.mitmcert.to_pem().decode("utf-8", errors="backslashreplace")
             )
             data += "OpenSSL command: openssl x509 -in cert.pem -text"
-            self.mixto.AddCommit(
-                data=data, title=self._get_title("certificate"), entry_id=mixto_entry_id
-            )
-            self._success_msg()
+            return data
+
+        try:
+            self._commit_flows(flows, serialize, "certificate")
         except Exception as e:
             if hasattr(e, "message"):
                 ctx.log.error(e.message)
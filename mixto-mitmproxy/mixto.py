@@ -1,6 +1,12 @@
-from urllib.request import Request, urlopen
-from urllib.parse import urlencode, urljoin
-from urllib.error import HTTPError
+from typing import Any, Dict, List, Union, Tuple
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.parse import unquote, urlencode, urljoin, urlparse
+from urllib.request import getproxies, proxy_bypass
+from base64 import b64encode
+from threading import Lock
+from time import monotonic
+import io
+import socket
 from pathlib import Path
 from os import getenv
 import json
@@ -8,6 +14,14 @@ import json
 MIXTO_ENTRY_ID = getenv("MIXTO_ENTRY_ID")
 MIXTO_HOST = getenv("MIXTO_HOST")
 MIXTO_API_KEY = getenv("MIXTO_API_KEY")
+# timeouts in seconds. MIXTO_CALL_TIMEOUT bounds a whole call, reconnects included
+MIXTO_CONNECT_TIMEOUT = float(getenv("MIXTO_CONNECT_TIMEOUT", 5))
+MIXTO_READ_TIMEOUT = float(getenv("MIXTO_READ_TIMEOUT", 30))
+MIXTO_CALL_TIMEOUT = float(getenv("MIXTO_CALL_TIMEOUT", 60))
+
+# statuses whose Location is followed, like urlopen does
+REDIRECTS = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
 
 
 class MissingRequired(Exception):
@@ -22,6 +36,34 @@ class BadResponse(Exception):
     pass
 
 
+class RequestTimeout(Exception):
+    """Mixto API call timed out or ran past its deadline"""
+
+    pass
+
+
+class _DeadlineSocket:
+    """Socket of the pooled connection that sets its timeout from
+    next_timeout before every recv, so a response trickling in byte by byte
+    cannot outlive the call deadline"""
+
+    def __init__(self, sock: socket.socket):
+        self._sock = sock
+        self.next_timeout = None
+
+    def recv_into(self, *args) -> int:
+        if self.next_timeout is not None:
+            self._sock.settimeout(self.next_timeout())
+        return self._sock.recv_into(*args)
+
+    def makefile(self, mode: str = "rb") -> io.BufferedReader:
+        # http.client reads the response through this, so its recvs come back here
+        return io.BufferedReader(socket.SocketIO(self, "rb"))
+
+    def __getattr__(self, name: str):
+        return getattr(self._sock, name)
+
+
 class MixtoLite:
     def __init__(self, host: str = None, api_key: str = None) -> None:
         super().__init__()
@@ -29,6 +71,12 @@ class MixtoLite:
         self.api_key = api_key
         self.status = 0
         self.commit_type = "tool"
+        self.connect_timeout = MIXTO_CONNECT_TIMEOUT
+        self.read_timeout = MIXTO_READ_TIMEOUT
+        self.call_timeout = MIXTO_CALL_TIMEOUT
+        # single keep-alive connection reused across requests
+        self._conn = None
+        self._conn_lock = Lock()
 
         # if envars are set, always use those values
         if MIXTO_HOST is not None and self.host is None:
@@ -45,6 +93,10 @@ class MixtoLite:
                     self.host = j["host"]
                     self.api_key = j["api_key"]
                     self.workspace_id = j["workspace_id"]
+                    # optional timeouts, envars still take precedence
+                    for k in ("connect_timeout", "read_timeout", "call_timeout"):
+                        if k in j and getenv("MIXTO_" + k.upper()) is None:
+                            setattr(self, k, float(j[k]))
             except:
                 print("Cannot read mixto config file")
                 raise
@@ -56,6 +108,8 @@ class MixtoLite:
         body: dict = {},
         query: dict = {},
         isJSON: bool = True,
+        timeout: Union[float, None] = None,
+        deadline: Union[float, None] = None,
     ):
         """Generic method helpful in extending this lib for other Mixto
         API calls. Refer to Mixto docs for all available API endpoints.
@@ -66,10 +120,13 @@ class MixtoLite:
             body (dict, optional): Body. Defaults to {}.
             query (dict, optional): Query params. Defaults to {}.
             isJSON (bool, optional): If the response is of type JSON. Defaults to True.
+            timeout (float, optional): Budget in seconds for this call. Defaults to call_timeout.
+            deadline (float, optional): Absolute time.monotonic() deadline passed down
+                by batch operations. The earlier of timeout and deadline wins.
 
         Raises:
             BadResponse: [description]
-            BadResponse: [description]
+            RequestTimeout: If the call times out or runs past its deadline
 
         Returns:
             [type]: [description]
@@ -78,31 +135,150 @@ class MixtoLite:
         q = ""
         if query:
             q = "?" + urlencode(query)
-        req = Request(
-            method=method.upper(),
-            url=url + q,
-            data=json.dumps(body).encode(),
-            headers={
-                "x-api-key": self.api_key,
-                "user-agent": "mixto-lite-py",
-            },
-        )
+        headers = {
+            "x-api-key": self.api_key,
+            "user-agent": "mixto-lite-py",
+        }
         if body:
-            req.add_header("Content-Type", "application/json")
+            headers["Content-Type"] = "application/json"
+        budget = monotonic() + (self.call_timeout if timeout is None else timeout)
+        data = self._send(
+            method.upper(),
+            urlparse(url).path + q,
+            json.dumps(body).encode(),
+            headers,
+            budget if deadline is None else min(budget, deadline),
+        )
+        if self.status > 300:
+            raise BadResponse(self.status, data)
+        body = data.decode()
+        if isJSON:
+            return json.loads(str(body))
+        else:
+            return body
+
+    def _proxy(self, url: str) -> Union[Tuple[str, Dict[str, str]], None]:
+        """Proxy address and auth headers for url from HTTP(S)_PROXY, None if
+        there is no proxy for its scheme or NO_PROXY excludes its host"""
+        u = urlparse(url)
+        proxy = getproxies().get(u.scheme)
+        if not proxy or proxy_bypass(u.hostname or ""):
+            return None
+        p = urlparse(proxy if "//" in proxy else "http://" + proxy)
+        headers = {}
+        if p.username:
+            creds = f"{unquote(p.username)}:{unquote(p.password or '')}"
+            headers["Proxy-Authorization"] = "Basic " + b64encode(creds.encode()).decode()
+        return p.netloc.rpartition("@")[2], headers
+
+    def _new_connection(self, url: Union[str, None] = None) -> HTTPConnection:
+        """New, not yet connected connection to the origin of url, the Mixto
+        host by default. https is tunnelled through the proxy with CONNECT"""
+        u = urlparse(url or str(self.host))
+        cls = HTTPSConnection if u.scheme == "https" else HTTPConnection
+        proxy = self._proxy(u.geturl())
+        if proxy is None:
+            return cls(u.netloc)
+        conn = cls(proxy[0])
+        if u.scheme == "https":
+            conn.set_tunnel(u.hostname, u.port, proxy[1])
+        return conn
+
+    def _connection(self) -> HTTPConnection:
+        """Get the pooled connection to the Mixto host, creating it if needed"""
+        if self._conn is None:
+            self._conn = self._new_connection()
+        return self._conn
+
+    def _send(
+        self, method: str, path: str, data: bytes, headers: dict, deadline: float
+    ) -> bytes:
+        """Send a request over the pooled connection and return the raw body.
+        Redirects are followed the way urlopen does: GET and HEAD go to the new
+        location, a POST answered with 301, 302 or 303 becomes a bodiless GET"""
+        url = urljoin(str(self.host), path)
+        with self._conn_lock:
+            for _ in range(MAX_REDIRECTS + 1):
+                body, location = self._request(method, url, data, headers, deadline)
+                if location is None:
+                    return body
+                if method not in ("GET", "HEAD"):
+                    if method != "POST" or self.status not in (301, 302, 303):
+                        return body
+                    method, data = "GET", None
+                    headers = {k: v for k, v in headers.items() if k != "Content-Type"}
+                url = urljoin(url, location)
+        raise BadResponse(self.status, f"More than {MAX_REDIRECTS} redirects")
+
+    def _request(
+        self, method: str, url: str, data: bytes, headers: dict, deadline: float
+    ) -> Tuple[bytes, Union[str, None]]:
+        """One request to url. The Mixto host is reached over the pooled
+        connection, other hosts a redirect points to over a one-off one"""
+        if urlparse(url)[:2] != urlparse(str(self.host))[:2]:
+            conn = self._new_connection(url)
+            try:
+                return self._roundtrip(conn, method, url, data, headers, deadline)
+            finally:
+                conn.close()
+        conn = self._connection()
+        try:
+            return self._roundtrip(conn, method, url, data, headers, deadline)
+        except (ConnectionResetError, BrokenPipeError):
+            # the server dropped the idle keep-alive connection, reopen once
+            return self._roundtrip(conn, method, url, data, headers, deadline)
+
+    def _roundtrip(
+        self,
+        conn: HTTPConnection,
+        method: str,
+        url: str,
+        data: bytes,
+        headers: dict,
+        deadline: float,
+    ) -> Tuple[bytes, Union[str, None]]:
+        u = urlparse(url)
+        target = u.path + ("?" + u.query if u.query else "")
+        proxy = self._proxy(url) if u.scheme == "http" else None
+        if proxy is not None:
+            # plain http goes to the proxy with the absolute url as target
+            target = url
+            headers = {**headers, **proxy[1]}
         try:
-            res = urlopen(req)
-            body = res.read().decode()
-            self.status = res.getcode()
-            if self.status > 300:
-                raise BadResponse(self.status, res)
-            if isJSON:
-                return json.loads(str(body))
-            else:
-                return body
-        except HTTPError as e:
-            raise BadResponse(e.code, e.read())
-
-    def AddCommit(self, data: str, entry_id: str = None, title: str = ""):
+            if conn.sock is None:
+                conn.timeout = self._remaining(deadline, self.connect_timeout)
+                conn.connect()
+                conn.sock = _DeadlineSocket(conn.sock)
+            conn.sock.settimeout(self._remaining(deadline, self.read_timeout))
+            conn.sock.next_timeout = lambda: self._remaining(deadline, self.read_timeout)
+            conn.request(method, target, body=data, headers=headers)
+            res = conn.getresponse()
+            self.status = res.status
+            body = res.read()
+            if res.status in REDIRECTS:
+                return body, res.getheader("Location")
+            return body, None
+        except socket.timeout:
+            conn.close()
+            raise RequestTimeout(f"Mixto did not respond in time: {method} {u.path}")
+        except Exception:
+            conn.close()
+            raise
+
+    def _remaining(self, deadline: float, limit: float) -> float:
+        """Socket timeout capped by what is left of the call deadline"""
+        left = deadline - monotonic()
+        if left <= 0:
+            raise RequestTimeout("Mixto call ran past its deadline")
+        return min(left, limit)
+
+    def AddCommit(
+        self,
+        data: str,
+        entry_id: str = None,
+        title: str = "",
+        deadline: Union[float, None] = None,
+    ):
         """Add/commit data to an entry. This is the primary functionality of
         an integration
 
@@ -110,6 +286,7 @@ class MixtoLite:
             data (str): Data to add
             entry_id (str, optional): Entry ID. Will use MIXTO_ENTRY_ID as primary. Defaults to None.
             title (str, optional): Title for commit. Defaults to "Untitled".
+            deadline (float, optional): Absolute time.monotonic() deadline from a batch operation.
 
         Raises:
             MissingRequired: If entry id is missing
@@ -131,9 +308,76 @@ class MixtoLite:
                 "entry_id": e_id,
                 "workspace_id": self.workspace_id,
             },
+            deadline=deadline,
         )
         return r
 
+    def GraphQL(
+        self,
+        query: str,
+        variables: Union[Dict[str, Any], None] = None,
+        deadline: Union[float, None] = None,
+    ) -> Dict[str, Any]:
+        """Make a graphql request
+
+        Args:
+            query (str): GQL query string
+            variables (Union[Dict[str, Any], None], optional): GQL variables. Defaults to None.
+            deadline (float, optional): Absolute time.monotonic() deadline from a batch operation.
+
+        Raises:
+            ValueError: If the data key is not found in the response
+
+        Returns:
+            Dict[str, Any]: GQL response
+        """
+        body: Dict[str, Any] = {"query": query}
+        if variables is not None:
+            body["variables"] = variables
+        resp = self.MakeRequest("POST", "/api/v1/gql", body=body, deadline=deadline)
+
+        if "data" not in resp:
+            raise ValueError(resp)
+
+        return resp["data"]
+
+    def AddCommits(
+        self, commits: List[Dict[str, Any]], deadline: Union[float, None] = None
+    ) -> List[str]:
+        """Add several commits in one request. Mixto inserts them in one
+        transaction, so either all of them are added or none
+
+        Args:
+            commits (List[Dict[str, Any]]): Commits with data and title, and optionally
+                entry_id and commit_type. workspace_id is set to the current workspace,
+                entry_id defaults to MIXTO_ENTRY_ID and commit_type to the commit_type
+                of this instance
+            deadline (float, optional): Absolute time.monotonic() deadline from a batch operation.
+
+        Raises:
+            MissingRequired: If a commit has no entry id
+
+        Returns:
+            List[str]: The commit ids, in the order of commits
+        """
+        mutation = """mutation m($objects: [mixto_commits_insert_input!]!) {
+            insert_mixto_commits(objects: $objects) {
+                returning {
+                    commit_id
+                }
+            }
+        }"""
+        objects = []
+        for c in commits:
+            o = {"workspace_id": self.workspace_id, "commit_type": self.commit_type, **c}
+            if MIXTO_ENTRY_ID:
+                o["entry_id"] = MIXTO_ENTRY_ID
+            if not o.get("entry_id"):
+                raise MissingRequired("Entry id is missing")
+            objects.append(o)
+        resp = self.GraphQL(mutation, {"objects": objects}, deadline=deadline)
+        return [r["commit_id"] for r in resp["insert_mixto_commits"]["returning"]]
+
     def GetEntries(self):
         """Get all workspaces, entries and commits in a compact format.
         Helpful when trying to populate entry ID and commit ID's or